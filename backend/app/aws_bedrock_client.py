@@ -1,9 +1,9 @@
 # app/aws_bedrock_client.py
 
 import asyncio
-import boto3
 from dotenv import load_dotenv
 import os
+import threading
 from typing import Optional, List, Dict, Any
 
 # ------------------ Load Environment Variables ------------------
@@ -15,16 +15,46 @@ class BedrockClient:
   """
   Thin async wrapper around the Amazon Bedrock Runtime `converse` API
   for different LLM models.
+
+  boto3 is imported and the session / credentials are resolved on first use
+  (or by `warm_up()`), not at construction, so importing this module stays cheap.
   """
 
   def __init__(
     self,
     region_name: Optional[str] = None,
     profile_name: Optional[str] = None,
+    endpoint_url: Optional[str] = None,
   ) -> None:
+    self._region_name = region_name
+    self._profile_name = profile_name
+    self._endpoint_url = endpoint_url
+    self._client: Any = None
+    self._lock = threading.Lock()
+
+  @property
+  def client(self) -> Any:
+    """
+    The underlying boto3 `bedrock-runtime` client, created on first access.
+    """
+    if self._client is None:
+      with self._lock:
+        if self._client is None:
+          self._client = self._create_client()
+    return self._client
+
+  def warm_up(self) -> None:
+    """
+    Build the boto3 client ahead of the first request.
+    """
+    _ = self.client
+
+  def _create_client(self) -> Any:
+    import boto3
+
     session_kwargs: Dict[str, Any] = {}
-    if profile_name:
-      session_kwargs["profile_name"] = profile_name
+    if self._profile_name:
+      session_kwargs["profile_name"] = self._profile_name
 
     # Create the boto3 session AFTER env vars are loaded
     session = boto3.Session(**session_kwargs) if session_kwargs else boto3.Session()
@@ -43,11 +73,16 @@ class BedrockClient:
       print("=================")
 
     # Region: from argument, then env var, then default
-    resolved_region = region_name or os.getenv("AWS_REGION") or "us-east-1"
+    resolved_region = self._region_name or os.getenv("AWS_REGION") or "us-east-1"
+
+    # Endpoint: from argument, then env var (e.g. a local stand-in used by the
+    # benchmarks), otherwise boto3 picks the real regional endpoint
+    resolved_endpoint = self._endpoint_url or os.getenv("BEDROCK_ENDPOINT_URL") or None
 
-    self.client = session.client(
+    return session.client(
       "bedrock-runtime",
       region_name=resolved_region,
+      endpoint_url=resolved_endpoint,
     )
 
   # ---------- Internal Sync Helper ----------
@@ -162,5 +197,5 @@ class BedrockClient:
     )
 
 
-# Default instance used by the rest of the app
+# Default instance used by the rest of the app (the boto3 client is created lazily)
 aws_bedrock_client = BedrockClient()
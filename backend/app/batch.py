@@ -0,0 +1,412 @@
+# app/batch.py
+
+import asyncio
+import json
+import os
+import re
+import tempfile
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from .model_config import MODEL_CONFIGS
+from .pipelines import get_embeddings, handle_chat, retrieve_by_vector
+from .serialization import dumps_json, loads_json
+from .shards import shard_paths
+
+
+# ------------------ Settings ------------------
+# Where per-job progress files live (one JSONL file per job_id)
+BATCH_DIR = os.getenv(
+    "HYPERCHAT_BATCH_DIR", os.path.join(tempfile.gettempdir(), "hyperchat-batch")
+)
+
+DEFAULT_CONCURRENCY = 8
+MAX_CONCURRENCY = 64
+
+# Embedding micro-batching: flush when this many queries are pending,
+# or after this many seconds, whichever comes first
+EMBED_BATCH_SIZE = 64
+EMBED_BATCH_WAIT = 0.02
+
+BATCH_FORMATS = ("hyperchat", "bedrock")
+
+_JOB_ID_RE = re.compile(r"^[A-Za-z0-9_.-]{1,128}$")
+
+
+class BatchError(ValueError):
+    """
+    Raised for a malformed batch request (bad job id, format, backend).
+    """
+
+
+# ------------------ Embedding Batcher ------------------
+class EmbeddingBatcher:
+    """
+    Coalesces concurrent `embed(query)` calls into one `embed_documents` call
+    per flush, and remembers vectors so repeated queries are embedded once.
+    """
+
+    def __init__(self, embeddings: Any, batch_size: int = EMBED_BATCH_SIZE, max_wait: float = EMBED_BATCH_WAIT) -> None:
+        self._embeddings = embeddings
+        self._batch_size = batch_size
+        self._max_wait = max_wait
+        self._cache: Dict[str, asyncio.Future] = {}
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+
+    async def embed(self, query: str) -> List[float]:
+        future = self._cache.get(query)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._cache[query] = future
+            self._pending.append((query, future))
+
+            if len(self._pending) >= self._batch_size:
+                self._flush()
+            elif self._flush_handle is None:
+                self._flush_handle = asyncio.get_running_loop().call_later(self._max_wait, self._flush)
+        return await asyncio.shield(future)
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        texts = [q for q, _ in batch]
+        try:
+            vectors = await asyncio.to_thread(self._embeddings.embed_documents, texts)
+        except Exception as e:
+            for query, future in batch:
+                # Drop failed entries from the cache so a later item can retry
+                self._cache.pop(query, None)
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+
+# ------------------ Shared Retrieval ------------------
+class SharedRetriever:
+    """
+    Retrieval shared by all RAG items of one batch: queries are embedded via
+    the EmbeddingBatcher and identical (backend, query, scope) lookups are
+    searched once.
+    """
+
+    def __init__(self, openai_api_key: Optional[str]) -> None:
+        self._openai_api_key = openai_api_key
+        self._batchers: Dict[int, EmbeddingBatcher] = {}
+        self._results: Dict[str, asyncio.Task] = {}
+
+    async def retrieve(
+        self,
+        config: dict,
+        message: str,
+        shards: Optional[List[str]] = None,
+        filters: Optional[dict] = None,
+    ) -> list:
+        key = json.dumps(
+            [shard_paths(config), message, shards, filters], sort_keys=True, default=str
+        )
+        task = self._results.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._retrieve(config, message, shards, filters))
+            self._results[key] = task
+            task.add_done_callback(lambda t: self._forget_failed(key, t))
+        return await asyncio.shield(task)
+
+    def _forget_failed(self, key: str, task: asyncio.Task) -> None:
+        # Like EmbeddingBatcher._run: a failed lookup isn't cached, so a
+        # later item with the same query can retry
+        if (task.cancelled() or task.exception() is not None) and self._results.get(key) is task:
+            del self._results[key]
+
+    async def _retrieve(
+        self,
+        config: dict,
+        message: str,
+        shards: Optional[List[str]],
+        filters: Optional[dict],
+    ) -> list:
+        embeddings = await asyncio.to_thread(get_embeddings, self._openai_api_key)
+        batcher = self._batchers.get(id(embeddings))
+        if batcher is None:
+            batcher = EmbeddingBatcher(embeddings)
+            self._batchers[id(embeddings)] = batcher
+
+        vector = await batcher.embed(message)
+        return await retrieve_by_vector(self._openai_api_key, config, vector, shards, filters)
+
+
+# ------------------ Progress (resume) ------------------
+def _progress_path(job_id: str) -> str:
+    return os.path.join(BATCH_DIR, f"{job_id}.jsonl")
+
+
+def load_progress(job_id: str) -> Dict[str, dict]:
+    """
+    Successful results already recorded for a job, keyed by item id.
+    Failed items are not returned, so they are retried on resume.
+    """
+    path = _progress_path(job_id)
+    done: Dict[str, dict] = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Torn last line from an interrupted run
+                continue
+            if "error" not in record:
+                done[str(record.get("_item_id"))] = record
+    return done
+
+
+# ------------------ Input / Output Formats ------------------
+def _anthropic_text(content: Any, field: str = "message content") -> str:
+    if isinstance(content, str):
+        return content
+    if content is None:
+        return ""
+    if not isinstance(content, list):
+        raise ValueError(f"{field} must be a string or a list of content parts")
+
+    texts = []
+    for part in content:
+        if not isinstance(part, dict):
+            raise ValueError("content parts must be objects")
+        if part.get("type", "text") == "text":
+            text = part.get("text", "")
+            if not isinstance(text, str):
+                raise ValueError("text content parts must have a string 'text'")
+            texts.append(text)
+    return "".join(texts)
+
+
+def _item_id(raw: Dict[str, Any], index: int, format_: str) -> str:
+    # Lines without an id are numbered by position: 11 digits like Bedrock's
+    # own recordIds, or "line-<n>" so they can't be mistaken for an item's id
+    if format_ == "bedrock":
+        return str(raw.get("recordId") or f"{index:011d}")
+    item_id = raw.get("id")
+    return f"line-{index}" if item_id is None else str(item_id)
+
+
+def _invalid_item(line: str, index: int, format_: str, default_backend: Optional[str]) -> dict:
+    """
+    Best-effort id / raw record for a line parse_item rejected, so its error
+    result keeps the recordId / id (and modelInput) the client sent.
+    """
+    try:
+        raw = loads_json(line)
+    except ValueError:
+        raw = None
+    if not isinstance(raw, dict):
+        raw = {}
+    backend = raw.get("backendId") if format_ == "hyperchat" else None
+    return {
+        "id": _item_id(raw, index, format_),
+        "backendId": backend if isinstance(backend, str) and backend else default_backend,
+        "raw": raw,
+    }
+
+
+def parse_item(line: str, index: int, format_: str, default_backend: Optional[str]) -> dict:
+    """
+    Normalize one input line to {"id", "backendId", "message", "history",
+    "shards", "filters", "system", "raw"}.
+
+    hyperchat: {"id": ..., "backendId": ..., "message": ..., "history": [...],
+                "shards": [...], "filters": {...}}
+    bedrock:   {"recordId": ..., "modelInput": {"system": ..., "messages": [...]}}
+               (Bedrock batch-inference record with an Anthropic messages body;
+               the backend comes from the job's backendId, and a "system"
+               prompt replaces the backend's own)
+    """
+    raw = loads_json(line)
+    if not isinstance(raw, dict):
+        raise ValueError("Each line must be a JSON object")
+
+    if format_ == "bedrock":
+        model_input = raw.get("modelInput") or {}
+        if not isinstance(model_input, dict):
+            raise ValueError("modelInput must be an object")
+        messages = model_input.get("messages") or []
+        if not isinstance(messages, list) or not all(isinstance(m, dict) for m in messages):
+            raise ValueError("modelInput.messages must be a list of message objects")
+        if not messages or messages[-1].get("role") != "user":
+            raise ValueError("modelInput.messages must end with a user message")
+        history = [
+            {"role": m.get("role", "user"), "content": _anthropic_text(m.get("content"))}
+            for m in messages[:-1]
+        ]
+        # Anthropic bodies allow a string or a list of text blocks
+        system = model_input.get("system")
+        return {
+            "id": _item_id(raw, index, format_),
+            "backendId": default_backend,
+            "message": _anthropic_text(messages[-1].get("content")),
+            "history": history,
+            "shards": None,
+            "filters": None,
+            "system": _anthropic_text(system, "modelInput.system") if system is not None else None,
+            "raw": raw,
+        }
+
+    return {
+        "id": _item_id(raw, index, format_),
+        "backendId": raw.get("backendId") or default_backend,
+        "message": raw.get("message", ""),
+        "history": raw.get("history") or [],
+        "shards": raw.get("shards"),
+        "filters": raw.get("filters"),
+        "system": None,
+        "raw": raw,
+    }
+
+
+def format_result(item: dict, format_: str, reply: Optional[str], error: Optional[str], elapsed: float) -> dict:
+    if format_ == "bedrock":
+        record: Dict[str, Any] = {"recordId": item["id"], "modelInput": item["raw"].get("modelInput")}
+        if error is not None:
+            record["error"] = {"errorCode": 400, "errorMessage": error}
+        else:
+            record["modelOutput"] = {
+                "type": "message",
+                "role": "assistant",
+                "content": [{"type": "text", "text": reply}],
+                "stop_reason": "end_turn",
+            }
+        return record
+
+    record = {"id": item["id"], "backendId": item["backendId"], "elapsed_ms": int(elapsed * 1000)}
+    if error is not None:
+        record["error"] = error
+    else:
+        record["reply"] = reply
+    return record
+
+
+# ------------------ Runner ------------------
+def validate_batch_params(format_: str, job_id: Optional[str], backend_id: Optional[str]) -> None:
+    """
+    Raise BatchError for job-level problems, before any item runs.
+    """
+    if format_ not in BATCH_FORMATS:
+        raise BatchError(f"Unknown batch format: {format_}")
+    if job_id is not None and not _JOB_ID_RE.match(job_id):
+        raise BatchError("job_id may only contain letters, digits, '.', '_' and '-'")
+    if format_ == "bedrock" and backend_id not in MODEL_CONFIGS:
+        raise BatchError("The bedrock format needs a known backendId for the job")
+
+
+async def run_batch(
+    lines: List[str],
+    openai_api_key: Optional[str],
+    concurrency: int = DEFAULT_CONCURRENCY,
+    job_id: Optional[str] = None,
+    format_: str = "hyperchat",
+    backend_id: Optional[str] = None,
+) -> AsyncIterator[str]:
+    """
+    Run JSONL chat items through the regular pipelines with bounded
+    concurrency and yield one JSONL result line per item, in completion order.
+
+    With a job_id, every result is appended to a progress file; re-running the
+    same job re-emits finished items from it and only runs the rest.
+    """
+    validate_batch_params(format_, job_id, backend_id)
+
+    concurrency = max(1, min(concurrency, MAX_CONCURRENCY))
+    semaphore = asyncio.Semaphore(concurrency)
+    retriever = SharedRetriever(openai_api_key)
+
+    done: Dict[str, dict] = {}
+    progress_file = None
+    if job_id is not None:
+        os.makedirs(BATCH_DIR, exist_ok=True)
+        done = load_progress(job_id)
+        progress_file = open(_progress_path(job_id), "a", encoding="utf-8")
+
+    async def run_item(index: int, line: str) -> dict:
+        try:
+            item = parse_item(line, index, format_, backend_id)
+        except ValueError as e:
+            # json.JSONDecodeError is a ValueError too
+            item = _invalid_item(line, index, format_, backend_id)
+            result = format_result(item, format_, None, f"Invalid item: {e}", 0.0)
+            result["_item_id"] = item["id"]
+            return result
+
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                config = MODEL_CONFIGS.get(item["backendId"] or "")
+                if not config:
+                    raise ValueError("Unknown model backendId")
+
+                retrieved_docs = None
+                if shard_paths(config):
+                    retrieved_docs = await retriever.retrieve(
+                        config, item["message"], item["shards"], item["filters"]
+                    )
+
+                reply = await handle_chat(
+                    openai_api_key,
+                    config,
+                    item["message"],
+                    item["history"],
+                    retrieved_docs=retrieved_docs,
+                    system_prompt=item["system"],
+                )
+                result = format_result(item, format_, reply, None, time.perf_counter() - started)
+            except Exception as e:
+                result = format_result(item, format_, None, str(e), time.perf_counter() - started)
+        result["_item_id"] = item["id"]
+        return result
+
+    def emit(result: dict) -> str:
+        if progress_file is not None:
+            progress_file.write(dumps_json(result).decode("utf-8") + "\n")
+            progress_file.flush()
+        public = {k: v for k, v in result.items() if k != "_item_id"}
+        return dumps_json(public).decode("utf-8") + "\n"
+
+    try:
+        tasks = []
+        for index, line in enumerate(lines):
+            if not line.strip():
+                continue
+            if done:
+                # Cheap id peek so finished items are never re-run
+                try:
+                    item_id = parse_item(line, index, format_, backend_id)["id"]
+                except ValueError:
+                    item_id = _invalid_item(line, index, format_, backend_id)["id"]
+                if item_id in done:
+                    public = {k: v for k, v in done[item_id].items() if k != "_item_id"}
+                    if format_ == "hyperchat":
+                        public["resumed"] = True
+                    yield dumps_json(public).decode("utf-8") + "\n"
+                    continue
+            tasks.append(asyncio.ensure_future(run_item(index, line)))
+
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield emit(await next_done)
+        finally:
+            # Client disconnected / generator closed: stop outstanding work
+            for task in tasks:
+                task.cancel()
+    finally:
+        if progress_file is not None:
+            progress_file.close()
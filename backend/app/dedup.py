@@ -0,0 +1,198 @@
+# app/dedup.py
+"""
+Exact + near-duplicate detection for chunks / retrieved documents.
+
+- Exact: sha1 of the normalized text (case / whitespace / punctuation folded)
+- Near:  MinHash signatures over word shingles, bucketed with LSH banding,
+         confirmed by the estimated Jaccard similarity
+
+The first occurrence survives and collects the provenance (source, page,
+section) of every duplicate folded into it under metadata["sources"].
+Works on anything with `page_content` and `metadata` (LangChain Documents).
+"""
+
+import copy
+import hashlib
+import re
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+# ------------------ Settings ------------------
+NUM_PERM = 64
+BANDS = 16  # 16 bands x 4 rows -> candidate pairs from ~0.5 Jaccard upwards
+SHINGLE_WORDS = 3
+NEAR_DUP_THRESHOLD = 0.8
+
+# Everything shards.MetadataIndex filters on must be here too, or a passage
+# folded into another tenant's / document's survivor becomes unfilterable
+PROVENANCE_KEYS = ("source_name", "source_path", "page", "section", "tenant", "doc_type", "date")
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_MASK64 = (1 << 64) - 1
+_WORD_RE = re.compile(r"\w+")
+
+
+def _permutations(num_perm: int) -> List[Tuple[int, int]]:
+    # Deterministic (a, b) pairs so signatures are stable across runs.
+    # Kept below 2**32 so a * h fits in uint64 for the numpy path.
+    perms = []
+    for i in range(num_perm):
+        digest = hashlib.sha256(f"minhash-perm-{i}".encode("ascii")).digest()
+        a = int.from_bytes(digest[:4], "little") | 1
+        b = int.from_bytes(digest[4:8], "little")
+        perms.append((a, b))
+    return perms
+
+
+_PERMS = _permutations(NUM_PERM)
+
+# numpy is imported on the first minhash call, not at app startup.
+# None = not tried yet, () = numpy missing, else (np, a column, b column)
+_numpy_perms: Optional[Tuple[Any, ...]] = None
+
+
+def _load_numpy_perms() -> Tuple[Any, ...]:
+    global _numpy_perms
+    if _numpy_perms is None:
+        try:
+            import numpy as np
+
+            _numpy_perms = (
+                np,
+                np.array([a for a, _ in _PERMS], dtype=np.uint64)[:, None],
+                np.array([b for _, b in _PERMS], dtype=np.uint64)[:, None],
+            )
+        except ImportError:
+            # Pure-Python fallback: same signatures, ~50x slower
+            _numpy_perms = ()
+    return _numpy_perms
+
+
+# ------------------ Hashing ------------------
+def normalize(text: str) -> List[str]:
+    return _WORD_RE.findall(text.lower())
+
+
+def exact_key(words: Sequence[str]) -> str:
+    return hashlib.sha1(" ".join(words).encode("utf-8")).hexdigest()
+
+
+def minhash(words: Sequence[str], shingle_words: int = SHINGLE_WORDS) -> Tuple[int, ...]:
+    """
+    MinHash signature of the text's word shingles.
+    """
+    if len(words) <= shingle_words:
+        shingles = {" ".join(words)}
+    else:
+        shingles = {" ".join(words[i:i + shingle_words]) for i in range(len(words) - shingle_words + 1)}
+
+    hashes = [
+        int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little")
+        for s in shingles
+    ]
+
+    numpy_perms = _load_numpy_perms()
+    if numpy_perms:
+        np, perm_a, perm_b = numpy_perms
+        h = np.array(hashes, dtype=np.uint64)[None, :]
+        # uint64 arithmetic wraps exactly like the & _MASK64 below
+        values = (perm_a * h + perm_b) % np.uint64(_MERSENNE_PRIME) & np.uint64(_MAX_HASH)
+        return tuple(int(v) for v in values.min(axis=1))
+
+    return tuple(
+        min((((a * h + b) & _MASK64) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+        for a, b in _PERMS
+    )
+
+
+def estimated_jaccard(sig_a: Sequence[int], sig_b: Sequence[int]) -> float:
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / len(sig_a)
+
+
+# ------------------ Provenance ------------------
+def _provenance(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: metadata[k] for k in PROVENANCE_KEYS if k in metadata}
+
+
+def _merge_provenance(survivor: Any, duplicate: Any) -> None:
+    # Build a new list: the survivor may share its "sources" list with a
+    # document cached in the vector store
+    sources = list(survivor.metadata.get("sources") or [_provenance(survivor.metadata)])
+    for entry in duplicate.metadata.get("sources") or [_provenance(duplicate.metadata)]:
+        if entry not in sources:
+            sources.append(entry)
+    survivor.metadata["sources"] = sources
+    survivor.metadata["duplicate_count"] = survivor.metadata.get("duplicate_count", 0) + 1
+
+
+# ------------------ Deduplication ------------------
+class Deduplicator:
+    """
+    Incremental deduplicator; `add` returns the surviving document, or None
+    when the document was folded into an earlier one.
+    """
+
+    def __init__(self, threshold: float = NEAR_DUP_THRESHOLD, copy_survivors: bool = False) -> None:
+        self.threshold = threshold
+        # Query-time callers must not mutate documents cached in the store
+        self.copy_survivors = copy_survivors
+        self.survivors: List[Any] = []
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+        self._exact: Dict[str, int] = {}
+        self._signatures: List[Tuple[int, ...]] = []
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], List[int]] = {}
+        self._rows = NUM_PERM // BANDS
+
+    def _bands(self, signature: Tuple[int, ...]) -> List[Tuple[int, Tuple[int, ...]]]:
+        r = self._rows
+        return [(i, signature[i * r:(i + 1) * r]) for i in range(BANDS)]
+
+    def _fold(self, index: int, doc: Any) -> None:
+        _merge_provenance(self.survivors[index], doc)
+
+    def add(self, doc: Any) -> Optional[Any]:
+        words = normalize(doc.page_content)
+
+        key = exact_key(words)
+        if key in self._exact:
+            self.exact_duplicates += 1
+            self._fold(self._exact[key], doc)
+            return None
+
+        signature = minhash(words)
+        bands = self._bands(signature)
+        candidates = {i for band in bands for i in self._buckets.get(band, ())}
+        for i in sorted(candidates):
+            if estimated_jaccard(signature, self._signatures[i]) >= self.threshold:
+                self.near_duplicates += 1
+                self._fold(i, doc)
+                return None
+
+        if self.copy_survivors:
+            doc = copy.copy(doc)
+            doc.metadata = dict(doc.metadata)
+
+        index = len(self.survivors)
+        self.survivors.append(doc)
+        self._signatures.append(signature)
+        self._exact[key] = index
+        for band in bands:
+            self._buckets.setdefault(band, []).append(index)
+        return doc
+
+
+def dedup_documents(
+    docs: Iterable[Any],
+    threshold: float = NEAR_DUP_THRESHOLD,
+    copy_survivors: bool = False,
+) -> List[Any]:
+    """
+    Drop exact and near-duplicate documents, keeping first occurrences (so
+    retrieval order / rank is preserved) with merged provenance.
+    """
+    deduplicator = Deduplicator(threshold=threshold, copy_survivors=copy_survivors)
+    for doc in docs:
+        deduplicator.add(doc)
+    return deduplicator.survivors
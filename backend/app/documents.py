@@ -0,0 +1,532 @@
+# app/documents.py
+"""
+Shared document extraction + chunking, used by both the upload path
+(pipelines.extract_text_from_uploaded_file) and the vector store builders
+under `pipelines/`.
+
+- Extraction: PDF (PyMuPDF if installed, else pypdf), DOCX (python-docx),
+  HTML (stdlib parser), Markdown and plain text
+- Structure: headings come from the format's own markup (Markdown "#", DOCX
+  heading styles, HTML <h1>-<h6>, PDF bookmarks) and are tracked as a
+  section path; plain text has none
+- Chunking: token-sized chunks (tiktoken when installed) that never cross a
+  section boundary, packed from paragraphs -> sentences -> token windows
+- Streaming: every step is a generator, so large files are never held as one
+  giant string and the first chunks are available immediately
+"""
+
+import io
+import os
+import re
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+# ------------------ Settings ------------------
+DEFAULT_CHUNK_TOKENS = 200  # ~800 characters, the old RecursiveCharacterTextSplitter size
+DEFAULT_OVERLAP_TOKENS = 25  # ~100 characters
+
+DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+
+# ------------------ Data Classes ------------------
+@dataclass
+class Section:
+    """
+    A run of text under one heading path, e.g. ("Risks", "Prompt Injection").
+    """
+
+    text: str
+    headings: Tuple[str, ...] = ()
+    page: Optional[int] = None
+
+    @property
+    def title(self) -> str:
+        return " > ".join(self.headings)
+
+
+@dataclass
+class Chunk:
+    text: str
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+# ------------------ Token Counting ------------------
+_encoding: Any = None
+_encoding_loaded = False
+_APPROX_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def _get_encoding() -> Any:
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            # Not installed or no cached BPE file offline: approximate instead
+            _encoding = None
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """
+    Token count with tiktoken's cl100k_base (what OpenAI embeddings use),
+    falling back to a word/punctuation approximation.
+    """
+    enc = _get_encoding()
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    return len(_APPROX_TOKEN_RE.findall(text))
+
+
+def _split_by_tokens(text: str, max_tokens: int) -> List[str]:
+    """
+    Windows of text that each count as at most max_tokens.
+    """
+    enc = _get_encoding()
+    if enc is not None:
+        ids = enc.encode(text, disallowed_special=())
+        windows = []
+        start = 0
+        while start < len(ids):
+            end = min(start + max_tokens, len(ids))
+            window = enc.decode(ids[start:end])
+            # A decoded slice can re-encode longer (split multi-byte chars)
+            while end - start > 1 and count_tokens(window) > max_tokens:
+                end -= 1
+                window = enc.decode(ids[start:end])
+            windows.append(window)
+            start = end
+        return windows
+
+    # Approximate counts add up word by word, so pack words greedily
+    windows = []
+    words: List[str] = []
+    words_tokens = 0
+    for word in text.split():
+        n = count_tokens(word)
+        if words and words_tokens + n > max_tokens:
+            windows.append(" ".join(words))
+            words, words_tokens = [], 0
+        if n > max_tokens:
+            # e.g. a long run of punctuation: split it into its own tokens
+            pieces = _APPROX_TOKEN_RE.findall(word)
+            windows.extend("".join(pieces[i:i + max_tokens]) for i in range(0, len(pieces), max_tokens))
+            continue
+        words.append(word)
+        words_tokens += n
+    if words:
+        windows.append(" ".join(words))
+    return windows
+
+
+# ------------------ Heading Detection ------------------
+# Headings only come from explicit structure: Markdown "#" lines (also what
+# the DOCX / HTML extractors emit) and PDF outlines. Guessing from plain
+# lines (numbering, capitals, "#") mistakes code comments and wrapped body
+# text for headings.
+_MD_HEADING_RE = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+
+# (page, normalized title) -> outline level
+Outline = Dict[Tuple[Optional[int], str], int]
+
+
+def _normalize_title(text: str) -> str:
+    return " ".join(text.split()).lower()
+
+
+def _heading_level(
+    page: Optional[int],
+    line: str,
+    markdown: bool,
+    outline: Optional[Outline],
+) -> Optional[Tuple[int, str]]:
+    """
+    (level, title) if the line is a heading, else None. Each outline entry
+    matches once, at the first line on its page with the same text.
+    """
+    stripped = line.strip()
+    if not stripped:
+        return None
+    if markdown:
+        m = _MD_HEADING_RE.match(stripped)
+        return (len(m.group(1)), m.group(2)) if m else None
+    if outline:
+        level = outline.pop((page, _normalize_title(stripped)), None)
+        if level is not None:
+            return level, " ".join(stripped.split())
+    return None
+
+
+def sections_from_lines(
+    lines: Iterable[Tuple[Optional[int], str]],
+    markdown: bool = False,
+    outline: Optional[Outline] = None,
+) -> Iterator[Section]:
+    """
+    Group (page, line) pairs into Sections, starting a new one at each heading
+    ("#" lines when `markdown`, else lines matching an `outline` entry).
+    A heading with no body of its own (a title right before a subheading)
+    still yields a Section, with empty text, so rebuilt plain text keeps it.
+    """
+    outline = dict(outline) if outline else None
+    path: List[Tuple[int, str]] = []
+    buf: List[str] = []
+    start_page: Optional[int] = None
+    heading_pending = False  # current heading not yielded yet
+
+    def flush() -> Optional[Section]:
+        text = "\n".join(buf).strip()
+        if not text and not heading_pending:
+            return None
+        return Section(text=text, headings=tuple(t for _, t in path), page=start_page)
+
+    for page, line in lines:
+        heading = _heading_level(page, line, markdown, outline)
+        if heading is not None:
+            section = flush()
+            if section:
+                yield section
+            buf = []
+            level, title = heading
+            while path and path[-1][0] >= level:
+                path.pop()
+            path.append((level, title))
+            start_page = page
+            heading_pending = True
+            continue
+
+        if not buf:
+            start_page = page
+        buf.append(line)
+
+    section = flush()
+    if section:
+        yield section
+
+
+# ------------------ Extractors ------------------
+def _pdf_pages(data: bytes) -> Iterator[Tuple[int, str]]:
+    """
+    (page_number, text) per page. PyMuPDF is several times faster than pypdf,
+    so it is used when installed.
+    """
+    try:
+        import fitz  # PyMuPDF
+    except ImportError:
+        fitz = None
+
+    if fitz is not None:
+        with fitz.open(stream=data, filetype="pdf") as doc:
+            for i, page in enumerate(doc):
+                yield i + 1, page.get_text("text")
+        return
+
+    from pypdf import PdfReader
+
+    reader = PdfReader(io.BytesIO(data))
+    for i, page in enumerate(reader.pages):
+        yield i + 1, page.extract_text() or ""
+
+
+def _pdf_outline(data: bytes) -> Outline:
+    """
+    The PDF's bookmarks as {(page, normalized title): level}; empty when the
+    PDF has none, in which case its text is one untitled section.
+    """
+    try:
+        import fitz  # PyMuPDF
+    except ImportError:
+        fitz = None
+
+    if fitz is not None:
+        with fitz.open(stream=data, filetype="pdf") as doc:
+            toc = doc.get_toc(simple=True)
+        outline: Outline = {}
+        for level, title, page in toc:
+            if page > 0:
+                outline.setdefault((page, _normalize_title(title)), level)
+        return outline
+
+    from pypdf import PdfReader
+
+    reader = PdfReader(io.BytesIO(data))
+    outline = {}
+
+    def walk(items: List[Any], level: int) -> None:
+        for item in items:
+            if isinstance(item, list):
+                walk(item, level + 1)
+                continue
+            try:
+                page = reader.get_destination_page_number(item) + 1
+            except Exception:
+                continue
+            outline.setdefault((page, _normalize_title(item.title or "")), level)
+
+    walk(reader.outline, 1)
+    return outline
+
+
+def _pdf_sections(data: bytes) -> Iterator[Section]:
+    def lines() -> Iterator[Tuple[Optional[int], str]]:
+        for page, text in _pdf_pages(data):
+            for line in text.splitlines():
+                yield page, line
+
+    return sections_from_lines(lines(), outline=_pdf_outline(data))
+
+
+def _docx_sections(data: bytes) -> Iterator[Section]:
+    from docx import Document  # pip install python-docx
+
+    doc = Document(io.BytesIO(data))
+    # Paragraph.style resolves the style part on every access (~2ms each), so
+    # map style ids to names once and read each paragraph's raw pStyle id
+    style_names = {s.style_id: s.name or "" for s in doc.styles}
+
+    def lines() -> Iterator[Tuple[Optional[int], str]]:
+        for p in doc.paragraphs:
+            text = p.text.strip()
+            if not text:
+                continue
+            style = style_names.get(p._p.style, "")
+            if style == "Title":
+                yield None, f"# {text}"
+            elif style.startswith("Heading"):
+                level = style.replace("Heading", "").strip()
+                level_n = int(level) if level.isdigit() else 1
+                yield None, "#" * min(level_n, 6) + " " + text
+            else:
+                # Blank line keeps DOCX paragraphs as separate chunking units
+                yield None, text
+                yield None, ""
+
+    return sections_from_lines(lines(), markdown=True)
+
+
+class _HTMLToLines(HTMLParser):
+    _BLOCK_TAGS = {"p", "div", "li", "br", "tr", "section", "article", "table", "ul", "ol"}
+    _SKIP_TAGS = {"script", "style", "noscript", "head"}
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.lines: List[str] = []
+        self._current: List[str] = []
+        self._heading: Optional[int] = None
+        self._skip = 0
+
+    def _flush(self) -> None:
+        text = " ".join("".join(self._current).split())
+        if text:
+            self.lines.append("#" * self._heading + " " + text if self._heading else text)
+        self._current = []
+
+    def handle_starttag(self, tag: str, attrs: Any) -> None:
+        if tag in self._SKIP_TAGS:
+            self._skip += 1
+        elif re.fullmatch(r"h[1-6]", tag):
+            self._flush()
+            self._heading = int(tag[1])
+        elif tag in self._BLOCK_TAGS:
+            self._flush()
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in self._SKIP_TAGS:
+            self._skip = max(0, self._skip - 1)
+        elif re.fullmatch(r"h[1-6]", tag):
+            self._flush()
+            self._heading = None
+        elif tag in self._BLOCK_TAGS:
+            self._flush()
+
+    def handle_data(self, data: str) -> None:
+        if not self._skip:
+            self._current.append(data)
+
+
+def _html_sections(data: bytes) -> Iterator[Section]:
+    parser = _HTMLToLines()
+    parser.feed(data.decode("utf-8", errors="ignore"))
+    parser.close()
+    parser._flush()
+    return sections_from_lines(((None, line) for line in parser.lines), markdown=True)
+
+
+def _text_sections(data: bytes, markdown: bool) -> Iterator[Section]:
+    text = data.decode("utf-8", errors="ignore")
+    return sections_from_lines(((None, line) for line in text.splitlines()), markdown=markdown)
+
+
+def detect_kind(file_name: Optional[str], file_mime: Optional[str]) -> str:
+    """
+    One of "pdf", "docx", "html", "markdown", "text".
+    """
+    name = (file_name or "").lower()
+    mime = (file_mime or "").lower()
+
+    if name.endswith(".pdf") or mime == "application/pdf":
+        return "pdf"
+    if name.endswith(".docx") or mime == DOCX_MIME:
+        return "docx"
+    if name.endswith((".html", ".htm")) or mime == "text/html":
+        return "html"
+    if name.endswith((".md", ".markdown")) or mime == "text/markdown":
+        return "markdown"
+    return "text"
+
+
+def extract_sections(
+    data: bytes,
+    file_name: Optional[str] = None,
+    file_mime: Optional[str] = None,
+) -> Iterator[Section]:
+    """
+    Stream the Sections of a document. Raises on a corrupt / unsupported
+    binary document; callers decide whether to fall back to a plain decode.
+    """
+    kind = detect_kind(file_name, file_mime)
+    if kind == "pdf":
+        return _pdf_sections(data)
+    if kind == "docx":
+        return _docx_sections(data)
+    if kind == "html":
+        return _html_sections(data)
+    return _text_sections(data, markdown=(kind == "markdown"))
+
+
+def sections_to_text(sections: Iterable[Section]) -> str:
+    parts = []
+    for section in sections:
+        if section.headings:
+            parts.append(section.headings[-1])
+        if section.text:
+            parts.append(section.text)
+    return "\n".join(parts)
+
+
+def extract_text(
+    data: Optional[bytes],
+    file_name: Optional[str] = None,
+    file_mime: Optional[str] = None,
+) -> str:
+    """
+    Plain text of a document, with a best-effort utf-8 decode as fallback.
+    """
+    if not data:
+        return ""
+    kind = detect_kind(file_name, file_mime)
+    if kind in ("text", "markdown"):
+        # Already plain text; no need to re-assemble it from sections
+        return data.decode("utf-8", errors="ignore")
+    try:
+        return sections_to_text(extract_sections(data, file_name, file_mime))
+    except Exception as e:
+        print(f"Failed to parse {file_name or 'upload'} as {kind}:", e)
+        return data.decode("utf-8", errors="ignore")
+
+
+# ------------------ Chunking ------------------
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(\[])")
+
+
+def _units(text: str, max_tokens: int) -> Iterator[Tuple[str, int]]:
+    """
+    (text, tokens) pieces no larger than max_tokens: paragraphs, or sentences
+    of oversized paragraphs, or token windows of oversized sentences.
+    """
+    for para in _PARAGRAPH_RE.split(text):
+        para = " ".join(para.split())
+        if not para:
+            continue
+        n = count_tokens(para)
+        if n <= max_tokens:
+            yield para, n
+            continue
+        for sentence in _SENTENCE_RE.split(para):
+            n = count_tokens(sentence)
+            if n <= max_tokens:
+                yield sentence, n
+                continue
+            for window in _split_by_tokens(sentence, max_tokens):
+                yield window, count_tokens(window)
+
+
+def iter_chunks(
+    sections: Iterable[Section],
+    chunk_tokens: int = DEFAULT_CHUNK_TOKENS,
+    overlap_tokens: int = DEFAULT_OVERLAP_TOKENS,
+    metadata: Optional[Dict[str, Any]] = None,
+) -> Iterator[Chunk]:
+    """
+    Stream token-sized chunks. Chunks never span two sections, start with the
+    section's heading path, and carry `overlap_tokens` of trailing context
+    from the previous chunk of the same section.
+    """
+    if overlap_tokens >= chunk_tokens:
+        raise ValueError("overlap_tokens must be smaller than chunk_tokens")
+
+    base = dict(metadata or {})
+    index = 0
+
+    for section in sections:
+        title = section.title
+        budget = chunk_tokens - (count_tokens(title) + 1 if title else 0)
+        budget = max(budget, chunk_tokens // 2)
+
+        buf: List[Tuple[str, int]] = []
+        buf_tokens = 0
+
+        def make() -> Chunk:
+            body = " ".join(t for t, _ in buf)
+            text = f"{title}\n{body}" if title else body
+            meta = dict(base)
+            meta.update({"chunk_index": index, "section": title, "tokens": buf_tokens})
+            if section.page is not None:
+                meta["page"] = section.page
+            return Chunk(text=text, metadata=meta)
+
+        for unit, n in _units(section.text, budget):
+            if buf and buf_tokens + n > budget:
+                yield make()
+                index += 1
+                # Carry trailing units over as overlap
+                tail: List[Tuple[str, int]] = []
+                tail_tokens = 0
+                for t, tn in reversed(buf):
+                    # The overlap must leave room for the unit being added
+                    if tail_tokens + tn > min(overlap_tokens, budget - n):
+                        break
+                    tail.insert(0, (t, tn))
+                    tail_tokens += tn
+                buf, buf_tokens = tail, tail_tokens
+            buf.append((unit, n))
+            buf_tokens += n
+
+        if buf:
+            yield make()
+            index += 1
+
+
+def iter_file_chunks(
+    path: str,
+    chunk_tokens: int = DEFAULT_CHUNK_TOKENS,
+    overlap_tokens: int = DEFAULT_OVERLAP_TOKENS,
+) -> Iterator[Chunk]:
+    """
+    Stream chunks of a file on disk, tagged with source_path / source_name.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    metadata = {"source_path": str(path), "source_name": os.path.basename(path)}
+    yield from iter_chunks(
+        extract_sections(data, os.path.basename(path)),
+        chunk_tokens=chunk_tokens,
+        overlap_tokens=overlap_tokens,
+        metadata=metadata,
+    )
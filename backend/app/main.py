@@ -1,14 +1,36 @@
 # app/main.py
+import asyncio
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request, Query
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 import os
 import json
-from pydantic import BaseModel
+from pydantic import ValidationError
 from typing import Any, List, Optional
 
+from .batch import DEFAULT_CONCURRENCY, MAX_CONCURRENCY, BatchError, run_batch, validate_batch_params
 from .model_config import MODEL_CONFIGS
-from .pipelines import handle_rag_chat, handle_general_chat, handle_tools_chat
+from .pipeline_engine import StageTimeoutError
+from .shards import ShardSelectionError, resolve_shards, validate_filters
+from .pipelines import (
+    InvalidHistoryError,
+    UnsupportedModelTypeError,
+    convert_history_for_bedrock,
+    handle_chat,
+    shutdown_extract_executor,
+    warm_up,
+)
+from .serialization import (
+    ChatResponse,
+    ChatTurn,
+    WireFormatError,
+    decode_chat_request,
+    encode_response,
+    loads_json,
+)
 
 
 # ------------------------------------ Configure API Keys / Tokens ----------------------------------
@@ -21,20 +43,40 @@ load_dotenv(dotenv_path=env_path, override=True)
 # Access the API keys stored in the environment variable
 openai_api_key = os.getenv("OPENAI_API_KEY")  # https://openai.com/api/
 
+# Preload vector stores / Bedrock client in the background once serving starts
+warmup_enabled = os.getenv("HYPERCHAT_WARMUP", "0").lower() in ("1", "true", "yes")
 
-# ------------------------------------ Chat Classes ----------------------------------
-class ChatRequest(BaseModel):
-    backendId: str
-    message: str
-    history: Optional[List[dict]] = None
 
+# ------------------------------------ Server Side Python Backend ----------------------------------
+def _log_warm_up_result(task: "asyncio.Task") -> None:
+    # warm_up handles each step's errors itself; this catches anything else
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Warm-up failed: {task.exception()}")
 
-class ChatResponse(BaseModel):
-    reply: str
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Kick off warm-up without blocking startup, so the server accepts traffic
+    immediately and the first RAG request usually finds its store loaded.
+    On shutdown, drop a warm-up that's still running and stop the
+    extraction pool.
+    """
+    warm_up_task = None
+    if warmup_enabled:
+        warm_up_task = asyncio.create_task(
+            asyncio.to_thread(warm_up, openai_api_key, MODEL_CONFIGS)
+        )
+        warm_up_task.add_done_callback(_log_warm_up_result)
+
+    yield
+
+    if warm_up_task is not None and not warm_up_task.done():
+        warm_up_task.cancel()
+    shutdown_extract_executor()
 
-# ------------------------------------ Server Side Python Backend ----------------------------------
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
 
 # CORS so React can call this
 app.add_middleware(
@@ -46,26 +88,94 @@ app.add_middleware(
 )
 
 
+async def run_chat(
+    request: Request,
+    backend_id: str,
+    message: str,
+    history: List[ChatTurn],
+    shards: Optional[List[str]] = None,
+    filters: Optional[dict] = None,
+    file_bytes: Optional[bytes] = None,
+    file_name: Optional[str] = None,
+    file_mime: Optional[str] = None,
+) -> Response:
+    """
+    Shared tail of the chat endpoints: validate backend, history + retrieval
+    scope, run the pipeline, encode the reply for the client.
+    """
+    config = MODEL_CONFIGS.get(backend_id)
+    if not config:
+        raise HTTPException(status_code=400, detail="Unknown model backendId")
+
+    # Validate + convert the history in one pass; the pipeline reuses it
+    try:
+        bedrock_history = convert_history_for_bedrock(history)
+    except InvalidHistoryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Validate the retrieval scope up front
+    try:
+        if shards:
+            resolve_shards(config, shards)
+        validate_filters(filters)
+    except ShardSelectionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Route the chat to the correct pipeline and pass file data
+    try:
+        reply = await handle_chat(
+            openai_api_key,
+            config,
+            message,
+            history,
+            file_bytes=file_bytes,
+            file_name=file_name,
+            file_mime=file_mime,
+            shards=shards,
+            filters=filters,
+            bedrock_history=bedrock_history,
+        )
+    except UnsupportedModelTypeError:
+        raise HTTPException(status_code=500, detail="Unsupported model type")
+    except StageTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+
+    # orjson / msgpack + gzip, depending on what the client accepts
+    return encode_response(
+        {"reply": reply},
+        accept=request.headers.get("accept"),
+        accept_encoding=request.headers.get("accept-encoding"),
+    )
+
+
 @app.post("/api/chat", response_model=ChatResponse)
 async def chat_endpoint(
+    request: Request,
     backendId: str = Form(...),
     message: str = Form(""),
     history: str = Form("[]"),
+    shards: str = Form(""),
+    filters: str = Form(""),
     file: UploadFile = File(None),
 ):
     """
     Chat endpoint that supports text, history, and an optional uploaded file.
-    The frontend sends multipart/form-data (FormData).
+    The frontend sends multipart/form-data (FormData) when a file is attached;
+    text-only chats can use the cheaper /api/chat/fast.
+    RAG backends also accept `shards` (comma-separated names) and `filters`
+    (JSON object) to scope retrieval.
     """
-    # Parse history JSON
+    # Parse history JSON (validated while converting, in run_chat)
     try:
-        history_list = json.loads(history) if history else []
-    except json.JSONDecodeError:
+        history_list = loads_json(history) if history else []
+    except ValueError:
         raise HTTPException(status_code=400, detail="Invalid history JSON")
 
-    config = MODEL_CONFIGS.get(backendId)
-    if not config:
-        raise HTTPException(status_code=400, detail="Unknown model backendId")
+    shard_list = [s.strip() for s in shards.split(",") if s.strip()] or None
+    try:
+        filters_dict = json.loads(filters) if filters else None
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid filters JSON")
 
     # Handle file (if any)
     file_bytes: Optional[bytes] = None
@@ -83,39 +193,81 @@ async def chat_endpoint(
         print("Size (bytes):", len(file_bytes))
         print("------------------------")
 
-    # Extract the LLM type
-    type_ = config["type"]
+    return await run_chat(
+        request,
+        backendId,
+        message,
+        history_list,
+        shards=shard_list,
+        filters=filters_dict,
+        file_bytes=file_bytes,
+        file_name=file_name,
+        file_mime=file_mime,
+    )
 
-    # Route the chat to the correct pipeline and pass file data
-    if type_ == "rag-assistant-1":
-        reply = await handle_rag_chat(
-            openai_api_key,
-            config,
-            message,
-            history_list,
-            file_bytes=file_bytes,
-            file_name=file_name,
-            file_mime=file_mime,
-        )
-    elif type_ == "tools-assistant-1":
-        reply = await handle_tools_chat(
-            config,
-            message,
-            history_list,
-            file_bytes=file_bytes,
-            file_name=file_name,
-            file_mime=file_mime,
-        )
-    elif type_ in ("general", "fine_tuned"):
-        reply = await handle_general_chat(
-            config,
-            message,
-            history_list,
-            file_bytes=file_bytes,
-            file_name=file_name,
-            file_mime=file_mime,
+
+@app.post("/api/chat/fast", response_model=ChatResponse)
+async def chat_fast_endpoint(request: Request):
+    """
+    Text-only chat as a single JSON or msgpack body (see app/serialization.py).
+    Skips multipart parsing and the JSON-in-a-form-field history string, so
+    long histories are parsed once.
+    """
+    body = await request.body()
+    try:
+        chat = decode_chat_request(
+            body,
+            request.headers.get("content-type"),
+            request.headers.get("content-encoding"),
         )
-    else:
-        raise HTTPException(status_code=500, detail="Unsupported model type")
+    except WireFormatError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except ValidationError as e:
+        raise RequestValidationError(e.errors(include_url=False, include_context=False))
+
+    return await run_chat(
+        request,
+        chat.backendId,
+        chat.message,
+        chat.history,
+        shards=chat.shards or None,
+        filters=chat.filters,
+    )
+
 
-    return ChatResponse(reply=reply)
+@app.post("/api/chat/batch")
+async def chat_batch_endpoint(
+    request: Request,
+    concurrency: int = Query(DEFAULT_CONCURRENCY, ge=1, le=MAX_CONCURRENCY),
+    job_id: Optional[str] = Query(None),
+    format: str = Query("hyperchat"),
+    backendId: Optional[str] = Query(None),
+):
+    """
+    Batch chat for offline / bulk workloads.
+    The body is JSONL (one chat item per line); the response streams back one
+    JSONL result per item as it finishes. Pass `job_id` to make the job
+    resumable and `format=bedrock` for Bedrock batch-inference records.
+    """
+    body = await request.body()
+    try:
+        lines = body.decode("utf-8").splitlines()
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Batch body must be UTF-8 JSONL")
+
+    try:
+        validate_batch_params(format, job_id, backendId)
+    except BatchError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return StreamingResponse(
+        run_batch(
+            lines,
+            openai_api_key,
+            concurrency=concurrency,
+            job_id=job_id,
+            format_=format,
+            backend_id=backendId,
+        ),
+        media_type="application/x-ndjson",
+    )
@@ -1,5 +1,7 @@
 # app/model_config.py
 
+import os
+
 # The new AWS LLM ARNS are located at:
 # https://us-east-1.console.aws.amazon.com/bedrock/home?region=us-east-1#/inference-profiles
 
@@ -23,7 +25,10 @@ MODEL_CONFIGS = {
         "type": "rag-assistant-1",
         "base_model": "arn:aws:bedrock:us-east-1:353207798728:inference-profile/global.anthropic.claude-sonnet-4-20250514-v1:0",
         "system_prompt": "You are a helpful assistant that answers questions given relevant context.",
-        "vector_store": r"C:\Users\Laptop\Desktop\Coding\React\hyperchat\pipelines\rag-assistant-1\vectorstore_db"
+        "vector_store": os.getenv(
+            "RAG_ASSISTANT_1_VECTOR_STORE",
+            r"C:\Users\Laptop\Desktop\Coding\React\hyperchat\pipelines\rag-assistant-1\vectorstore_db",
+        ),
     },
     "tools-assistant-1": {
         "type": "tools-assistant-1",
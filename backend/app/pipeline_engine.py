@@ -0,0 +1,147 @@
+# app/pipeline_engine.py
+
+import asyncio
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+
+# Print per-stage timings for every request (HYPERCHAT_LOG_STAGES=1)
+LOG_STAGES = os.getenv("HYPERCHAT_LOG_STAGES", "0").lower() in ("1", "true", "yes")
+
+
+# ------------------ Context ------------------
+@dataclass
+class ChatContext:
+    """
+    Everything one chat request carries through its pipeline.
+    Stages read their inputs from here and write their outputs back.
+    """
+
+    config: dict
+    message: str
+    history: Optional[list] = None
+    openai_api_key: Optional[str] = None
+    file_bytes: Optional[bytes] = None
+    file_name: Optional[str] = None
+    file_mime: Optional[str] = None
+
+    # Retrieval scope (RAG): shard names and metadata filters, None = defaults
+    shards: Optional[List[str]] = None
+    filters: Optional[Dict[str, Any]] = None
+
+    # Replaces config["system_prompt"] for this request when set
+    system_prompt: Optional[str] = None
+
+    # Stage outputs
+    uploaded_text: str = ""
+    retrieved_docs: Optional[list] = None
+    bedrock_history: List[Dict[str, Any]] = field(default_factory=list)
+    user_message: str = ""
+    reply: str = ""
+
+    # Instrumentation: stage name -> duration in ms
+    timings: Dict[str, float] = field(default_factory=dict)
+
+
+StageFn = Callable[[ChatContext], Awaitable[None]]
+
+
+# ------------------ Errors ------------------
+class StageTimeoutError(TimeoutError):
+    """
+    Raised when a stage exceeds its timeout.
+    """
+
+    def __init__(self, pipeline: str, stage: str, timeout: float) -> None:
+        super().__init__(f"Stage '{stage}' of pipeline '{pipeline}' timed out after {timeout}s")
+        self.pipeline = pipeline
+        self.stage = stage
+        self.timeout = timeout
+
+
+# ------------------ Stages / Pipelines ------------------
+@dataclass(frozen=True)
+class Stage:
+    """
+    One step of a pipeline.
+
+    `after` names the stages that must finish first; stages with no
+    dependency between them run concurrently. `timeout` is in seconds and can
+    be overridden per model config via "stage_timeouts".
+    """
+
+    name: str
+    fn: StageFn
+    after: Tuple[str, ...] = ()
+    timeout: Optional[float] = None
+
+
+class Pipeline:
+    """
+    A named set of stages forming a dependency graph. Each stage starts as
+    soon as everything it depends on has finished.
+    """
+
+    def __init__(self, name: str, stages: Sequence[Stage]) -> None:
+        self.name = name
+        self.stages = list(stages)
+
+        seen: set = set()
+        for stage in self.stages:
+            if stage.name in seen:
+                raise ValueError(f"Duplicate stage '{stage.name}' in pipeline '{name}'")
+            missing = [dep for dep in stage.after if dep not in seen]
+            if missing:
+                # Dependencies must be declared earlier, which also rules out cycles
+                raise ValueError(
+                    f"Stage '{stage.name}' in pipeline '{name}' depends on undeclared stages {missing}"
+                )
+            seen.add(stage.name)
+
+    async def _run_stage(self, stage: Stage, ctx: ChatContext, deps: List[asyncio.Task]) -> None:
+        if deps:
+            await asyncio.gather(*deps)
+
+        # A model config may override timeouts: {"stage_timeouts": {"generate": 60}}
+        timeout = (ctx.config.get("stage_timeouts") or {}).get(stage.name, stage.timeout)
+
+        started = time.perf_counter()
+        try:
+            if timeout is None:
+                await stage.fn(ctx)
+                return
+            task = asyncio.ensure_future(stage.fn(ctx))
+            try:
+                await asyncio.wait_for(task, timeout=timeout)
+            except asyncio.TimeoutError:
+                # wait_for cancels the stage at its deadline; a TimeoutError the
+                # stage raised itself (e.g. socket.timeout) propagates as is
+                if task.cancelled():
+                    raise StageTimeoutError(self.name, stage.name, timeout)
+                raise
+        finally:
+            ctx.timings[stage.name] = (time.perf_counter() - started) * 1000
+
+    async def run(self, ctx: ChatContext) -> ChatContext:
+        tasks: Dict[str, asyncio.Task] = {}
+        for stage in self.stages:
+            deps = [tasks[dep] for dep in stage.after]
+            tasks[stage.name] = asyncio.ensure_future(self._run_stage(stage, ctx, deps))
+
+        started = time.perf_counter()
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            # One stage failed: don't leave its siblings running
+            for task in tasks.values():
+                task.cancel()
+            raise
+        finally:
+            ctx.timings["total"] = (time.perf_counter() - started) * 1000
+            if LOG_STAGES:
+                parts = ", ".join(f"{k}={v:.1f}ms" for k, v in ctx.timings.items())
+                print(f"[pipeline {self.name}] {parts}")
+
+        return ctx
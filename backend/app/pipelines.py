@@ -1,21 +1,200 @@
 # app/pipelines.py
 
 from typing import List, Dict, Any, Optional
-import io
-
-from docx import Document  # pip install python-docx
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import os
+import threading
 
 from .aws_bedrock_client import aws_bedrock_client
+from .dedup import dedup_documents
+from .documents import detect_kind, extract_text
+from .pipeline_engine import ChatContext, Pipeline, Stage
+from .shards import (
+    Shard,
+    get_metadata_index,
+    resolve_shards,
+    search_shards,
+    shard_paths,
+    validate_filters,
+)
 from .tools import call_tools
 
-from langchain_community.vectorstores import FAISS
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import OpenAIEmbeddings
+# Heavy dependencies (PDF / DOCX parsers, langchain, FAISS) are imported on first use
+# inside the helpers below, so deployments that only serve general chat never
+# pay for them at startup.
+
+
+# ------------------ Lazy Resources ------------------
+_resource_lock = threading.Lock()
+_embeddings_cache: Dict[str, Any] = {}
+_vectorstore_cache: Dict[str, Any] = {}
+# One lock per store path, so cold loads of different shards run in parallel
+_vectorstore_locks: Dict[str, threading.Lock] = {}
+
+
+def get_embeddings(openai_api_key: Optional[str]) -> Any:
+    """
+    Shared OpenAIEmbeddings instance per API key (built on first use).
+    """
+    key = openai_api_key or ""
+    embeddings = _embeddings_cache.get(key)
+    if embeddings is None:
+        with _resource_lock:
+            embeddings = _embeddings_cache.get(key)
+            if embeddings is None:
+                from langchain_openai import OpenAIEmbeddings
+
+                embeddings = OpenAIEmbeddings(api_key=openai_api_key)
+                _embeddings_cache[key] = embeddings
+    return embeddings
+
+
+def get_vectorstore(vector_store: str, openai_api_key: Optional[str]) -> Any:
+    """
+    Load a FAISS vector store from disk once and reuse it across requests.
+    """
+    store = _vectorstore_cache.get(vector_store)
+    if store is None:
+        embeddings = get_embeddings(openai_api_key)
+        with _resource_lock:
+            path_lock = _vectorstore_locks.setdefault(vector_store, threading.Lock())
+        with path_lock:
+            store = _vectorstore_cache.get(vector_store)
+            if store is None:
+                from langchain_community.vectorstores import FAISS
+
+                store = FAISS.load_local(
+                    vector_store,
+                    embeddings,
+                    allow_dangerous_deserialization=True,  # required in newer langchain versions
+                )
+                _vectorstore_cache[vector_store] = store
+    return store
+
+
+# ------------------ Extraction Pool ------------------
+# Upload parsing (PDF / DOCX especially) is CPU-bound, so it runs off the event loop:
+# "process" (default) sidesteps the GIL, "thread" avoids copying uploads
+# between processes.
+EXTRACT_POOL = os.getenv("HYPERCHAT_EXTRACT_POOL", "process").lower()
+EXTRACT_WORKERS = int(os.getenv("HYPERCHAT_EXTRACT_WORKERS", "2"))
+
+# Text-like uploads smaller than this are decoded inline; not worth a hop
+INLINE_EXTRACT_MAX_BYTES = 64 * 1024
+
+# Own lock: callers run on the event loop, and _resource_lock can be held
+# for a whole vector-store load
+_extract_lock = threading.Lock()
+_extract_executor: Optional[Executor] = None
+
+
+def get_extract_executor() -> Executor:
+    """
+    The shared upload-extraction pool (created on first use).
+    """
+    global _extract_executor
+    if _extract_executor is None:
+        with _extract_lock:
+            if _extract_executor is None:
+                if EXTRACT_POOL == "thread":
+                    _extract_executor = ThreadPoolExecutor(
+                        max_workers=EXTRACT_WORKERS, thread_name_prefix="extract"
+                    )
+                else:
+                    # "spawn": forking a threaded asyncio server (possibly from the
+                    # warm-up thread) can copy held import / module locks and
+                    # deadlock the child
+                    _extract_executor = ProcessPoolExecutor(
+                        max_workers=EXTRACT_WORKERS,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+    return _extract_executor
+
+
+def shutdown_extract_executor() -> None:
+    global _extract_executor
+    with _extract_lock:
+        executor, _extract_executor = _extract_executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def extract_text_async(
+    file_bytes: Optional[bytes],
+    file_name: Optional[str],
+    file_mime: Optional[str],
+) -> str:
+    """
+    extract_text_from_uploaded_file without blocking the event loop.
+    """
+    if not file_bytes:
+        return ""
+    is_plain_text = detect_kind(file_name, file_mime) in ("text", "markdown")
+    if is_plain_text and len(file_bytes) <= INLINE_EXTRACT_MAX_BYTES:
+        return extract_text_from_uploaded_file(file_bytes, file_name, file_mime)
+
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(
+            get_extract_executor(),
+            extract_text_from_uploaded_file,
+            file_bytes,
+            file_name,
+            file_mime,
+        )
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM on a huge file); rebuild the pool next time
+        # and finish this request on a thread instead
+        print("Extraction pool broke; falling back to a thread for this upload")
+        shutdown_extract_executor()
+        return await asyncio.to_thread(
+            extract_text_from_uploaded_file, file_bytes, file_name, file_mime
+        )
+
+
+def warm_up(openai_api_key: Optional[str], model_configs: Dict[str, dict]) -> None:
+    """
+    Preload the Bedrock client, the extraction pool and every configured
+    vector store. Blocking; meant to run in a background thread after startup.
+    """
+    # Each step is best-effort: a failure is logged and warm-up moves on
+    try:
+        aws_bedrock_client.warm_up()
+        print("Warm-up: Bedrock client ready")
+    except Exception as e:
+        print(f"Warm-up: failed to create the Bedrock client: {e}")
+
+    # Spawning pool workers on the first upload would add to its latency
+    try:
+        executor = get_extract_executor()
+        for _ in range(EXTRACT_WORKERS):
+            executor.submit(extract_text_from_uploaded_file, b"warm-up", "warm-up.txt", "text/plain")
+    except Exception as e:
+        print(f"Warm-up: failed to start the extraction pool: {e}")
+
+    for backend_id, config in model_configs.items():
+        for shard_name, vector_store in shard_paths(config).items():
+            try:
+                store = get_vectorstore(vector_store, openai_api_key)
+                get_metadata_index(store)
+                print(f"Warm-up: loaded vector store {backend_id}/{shard_name}")
+            except Exception as e:
+                # A missing store should only fail its own requests
+                print(f"Warm-up: failed to load vector store {backend_id}/{shard_name}: {e}")
 
 
 # ------------------ Functions ------------------
 
 # Helper: convert frontend history -> Bedrock history
+class InvalidHistoryError(ValueError):
+    """
+    Raised when a history turn doesn't match the ChatTurn schema.
+    """
+
+
 def convert_history_for_bedrock(
     history: Optional[List[Dict[str, Any]]]
 ) -> List[Dict[str, Any]]:
@@ -27,24 +206,43 @@ def convert_history_for_bedrock(
     into the format expected by BedrockClient._converse_sync:
         [{ "role": "user" | "assistant", "content": "..." }, ...]
     (the client itself wraps content as {"text": ...}).
+
+    Every turn is checked against the ChatTurn schema (serialization.py) in
+    the same pass: an object whose "from" is user/bot, or whose "role" is
+    user/assistant, with string-or-null text / content. So a parsed request
+    body is validated once and copied once.
     """
     if not history:
         return []
+    if not isinstance(history, list):
+        raise InvalidHistoryError("history must be a list of turns")
 
     converted: List[Dict[str, Any]] = []
 
-    for turn in history:
+    for i, turn in enumerate(history):
+        if not isinstance(turn, dict):
+            raise InvalidHistoryError(f"history[{i}] must be an object")
+
         # Prefer explicit role/content if already present
         if "role" in turn or "content" in turn:
             raw_text = turn.get("content", "")
             role = turn.get("role", "user")
+            if role not in ("user", "assistant"):
+                raise InvalidHistoryError(f"history[{i}].role must be 'user' or 'assistant'")
         else:
             # React-style: { from, text }
             from_ = turn.get("from", "user")
+            if from_ not in ("user", "bot"):
+                raise InvalidHistoryError(f"history[{i}].from must be 'user' or 'bot'")
             raw_text = turn.get("text", "")
             role = "user" if from_ == "user" else "assistant"
 
-        text = (raw_text or "").strip()
+        if raw_text is None:
+            continue
+        if not isinstance(raw_text, str):
+            raise InvalidHistoryError(f"history[{i}] text must be a string")
+
+        text = raw_text.strip()
         if not text:
             continue
 
@@ -63,169 +261,261 @@ def extract_text_from_uploaded_file(
     """
     Extract readable text from an uploaded file.
 
-    - Handles DOCX via python-docx
+    - Handles PDF, DOCX and HTML via the shared extractors in documents.py
     - Handles text-like files (.txt, .md, .csv, .json, etc.)
     - Falls back to a best-effort utf-8 decode
     """
-    if not file_bytes:
-        return ""
+    return extract_text(file_bytes, file_name, file_mime)
 
-    mime = (file_mime or "").lower()
-    name = (file_name or "").lower()
-
-    # ---- DOCX (Word) ----
-    if (
-        name.endswith(".docx")
-        or mime
-        == "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-    ):
-        try:
-            doc = Document(io.BytesIO(file_bytes))
-            paragraphs = [p.text for p in doc.paragraphs if p.text.strip()]
-            return "\n".join(paragraphs)
-        except Exception as e:
-            print("Failed to parse DOCX:", e)
-            # fall through to generic decode
-
-    # ---- Plain text-like files ----
-    if mime.startswith("text/") or name.endswith(
-        (".txt", ".md", ".csv", ".py", ".json", ".log")
-    ):
-        try:
-            return file_bytes.decode("utf-8", errors="ignore")
-        except Exception:
-            return ""
-
-    # ---- Fallback: generic decode ----
-    try:
-        return file_bytes.decode("utf-8", errors="ignore")
-    except Exception:
-        return ""
 
+# ------------------ Shared Stages ------------------
+RAG_TOP_K = 4
+# Over-fetch so near-duplicate hits can be dropped and still leave RAG_TOP_K
+RAG_FETCH_K = 8
+UPLOAD_EXCERPT_CHARS = 4000
 
-# ------------------ RAG Pipeline ------------------
-async def handle_rag_chat(
-    openai_api_key: str,
+
+async def load_shards(
+    openai_api_key: Optional[str],
+    config: dict,
+    shards: Optional[List[str]] = None,
+) -> List[Shard]:
+    """
+    Load (or reuse the cached) FAISS stores for the selected shards.
+    """
+    paths = shard_paths(config)
+    names = resolve_shards(config, shards)
+    stores = await asyncio.gather(
+        *(asyncio.to_thread(get_vectorstore, paths[name], openai_api_key) for name in names)
+    )
+    return [Shard(name, store) for name, store in zip(names, stores)]
+
+
+async def retrieve_by_vector(
+    openai_api_key: Optional[str],
+    config: dict,
+    vector: List[float],
+    shards: Optional[List[str]] = None,
+    filters: Optional[dict] = None,
+) -> list:
+    """
+    Metadata-filtered search across the selected shards with an already
+    embedded query (the batch runner embeds queries in bulk).
+    """
+    loaded = await load_shards(openai_api_key, config, shards)
+    return await search_shards(loaded, vector, RAG_FETCH_K, validate_filters(filters))
+
+
+async def retrieve_documents(
+    openai_api_key: Optional[str],
     config: dict,
     message: str,
-    history: list | None,
-    file_bytes: Optional[bytes] = None,
-    file_name: Optional[str] = None,
-    file_mime: Optional[str] = None,
-) -> str:
-    # Extract the path from the vector store
-    vector_store = config["vector_store"]
+    shards: Optional[List[str]] = None,
+    filters: Optional[dict] = None,
+) -> list:
+    """
+    Similarity search against the backend's vector store(s). Store loading
+    and query embedding overlap; every blocking step runs on a worker thread.
+    """
+    loaded, vector = await asyncio.gather(
+        load_shards(openai_api_key, config, shards),
+        asyncio.to_thread(embed_query, openai_api_key, message),
+    )
+    return await search_shards(loaded, vector, RAG_FETCH_K, validate_filters(filters))
+
+
+def embed_query(openai_api_key: Optional[str], message: str) -> List[float]:
+    # Blocking: a cold get_embeddings imports langchain_openai
+    return get_embeddings(openai_api_key).embed_query(message)
 
-    # Embedding model using OpenAI's embedding API
-    embeddings = OpenAIEmbeddings(api_key=openai_api_key)
 
-    # Load FAISS vector store
-    vectorstore = FAISS.load_local(
-        vector_store,
-        embeddings,
-        allow_dangerous_deserialization=True,  # required in newer langchain versions
+def build_upload_note(message: str, uploaded_text: str, file_name: Optional[str]) -> str:
+    """
+    Append an uploaded-file excerpt to the user's message (general / tools chats).
+    """
+    if not uploaded_text:
+        return message
+    return (
+        f"{message}\n\n"
+        f"[The user also uploaded a file named '{file_name}'. "
+        f"Here is an excerpt of its contents:]\n"
+        f"{uploaded_text[:UPLOAD_EXCERPT_CHARS]}"
+    )
+
+
+async def extract_stage(ctx: ChatContext) -> None:
+    ctx.uploaded_text = await extract_text_async(
+        ctx.file_bytes, ctx.file_name, ctx.file_mime
     )
 
-    # Retrieve relevant documents using similarity search
-    results = vectorstore.similarity_search(message, k=4)
 
+async def history_stage(ctx: ChatContext) -> None:
+    # Skip when the endpoint already converted (and validated) it
+    if not ctx.bedrock_history:
+        # Convert React history -> Bedrock history
+        ctx.bedrock_history = convert_history_for_bedrock(ctx.history)
+
+
+async def retrieve_stage(ctx: ChatContext) -> None:
+    # Skip when the caller (e.g. the batch runner) already retrieved in bulk
+    if ctx.retrieved_docs is None:
+        ctx.retrieved_docs = await retrieve_documents(
+            ctx.openai_api_key, ctx.config, ctx.message, ctx.shards, ctx.filters
+        )
+
+
+async def generate_stage(ctx: ChatContext) -> None:
+    ctx.reply = await aws_bedrock_client.chat(
+        model=ctx.config["base_model"],
+        system=ctx.system_prompt if ctx.system_prompt is not None else ctx.config["system_prompt"],
+        message=ctx.user_message,
+        history=ctx.bedrock_history,
+    )
+
+
+# ------------------ RAG Pipeline ------------------
+async def dedup_stage(ctx: ChatContext) -> None:
+    # Same exact + near-duplicate pass the builder runs, applied to the hits;
+    # copies survivors so the cached store's documents are never mutated
+    survivors = await asyncio.to_thread(
+        dedup_documents, ctx.retrieved_docs or [], copy_survivors=True
+    )
+    ctx.retrieved_docs = survivors[:RAG_TOP_K]
+
+
+async def rag_assemble_stage(ctx: ChatContext) -> None:
     # Extract & join the context from documents
-    context = "\n\n".join(doc.page_content for doc in results)
+    context = "\n\n".join(doc.page_content for doc in ctx.retrieved_docs or [])
 
-    # Uploaded file text (if any)
-    uploaded_text = extract_text_from_uploaded_file(file_bytes, file_name, file_mime)
     uploaded_section = ""
-    if uploaded_text:
-        uploaded_excerpt = uploaded_text[:4000]
+    if ctx.uploaded_text:
+        uploaded_excerpt = ctx.uploaded_text[:UPLOAD_EXCERPT_CHARS]
         uploaded_section = (
-            f"\n\n--- Uploaded file excerpt ({file_name}) ---\n{uploaded_excerpt}"
+            f"\n\n--- Uploaded file excerpt ({ctx.file_name}) ---\n{uploaded_excerpt}"
         )
 
-    system_prompt = config["system_prompt"]
-
     # Build a plain user message string including context + uploaded file excerpt
-    user_message = (
-        f"Question: {message}\n\n"
+    ctx.user_message = (
+        f"Question: {ctx.message}\n\n"
         f"Context Text (from knowledge base):\n{context}"
         f"{uploaded_section}"
     )
 
-    # Convert history for Bedrock
-    bedrock_history = convert_history_for_bedrock(history)
 
-    # Call model
-    completion = await aws_bedrock_client.chat(
-        model=config["base_model"],
-        system=system_prompt,
-        message=user_message,
-        history=bedrock_history,
-    )
-    return completion
+RAG_PIPELINE = Pipeline(
+    "rag",
+    [
+        # extract / retrieve / history are independent and run concurrently
+        Stage("extract", extract_stage, timeout=30),
+        Stage("retrieve", retrieve_stage, timeout=30),
+        Stage("history", history_stage),
+        Stage("dedup", dedup_stage, after=("retrieve",)),
+        Stage("assemble", rag_assemble_stage, after=("extract", "dedup")),
+        Stage("generate", generate_stage, after=("assemble", "history"), timeout=120),
+    ],
+)
 
 
 # ------------------ General Chat Pipeline ------------------
+async def general_assemble_stage(ctx: ChatContext) -> None:
+    # If a file was uploaded, include an excerpt
+    ctx.user_message = build_upload_note(ctx.message, ctx.uploaded_text, ctx.file_name)
 
-async def handle_general_chat(
-    config: dict,
-    message: str,
-    history: list | None,
-    file_bytes: Optional[bytes] = None,
-    file_name: Optional[str] = None,
-    file_mime: Optional[str] = None,
-) -> str:
-    # Convert React history -> Bedrock history
-    bedrock_history = convert_history_for_bedrock(history)
 
-    # If a file was uploaded, include an excerpt
-    uploaded_text = extract_text_from_uploaded_file(file_bytes, file_name, file_mime)
-    if uploaded_text:
-        uploaded_excerpt = uploaded_text[:4000]
-        message_for_model = (
-            f"{message}\n\n"
-            f"[The user also uploaded a file named '{file_name}'. "
-            f"Here is an excerpt of its contents:]\n"
-            f"{uploaded_excerpt}"
-        )
-    else:
-        message_for_model = message
-
-    completion = await aws_bedrock_client.chat(
-        model=config["base_model"],
-        system=config["system_prompt"],
-        message=message_for_model,
-        history=bedrock_history,
-    )
-    return completion
+GENERAL_PIPELINE = Pipeline(
+    "general",
+    [
+        Stage("extract", extract_stage, timeout=30),
+        Stage("history", history_stage),
+        Stage("assemble", general_assemble_stage, after=("extract",)),
+        Stage("generate", generate_stage, after=("assemble", "history"), timeout=120),
+    ],
+)
 
 
 # ------------------ Tools Pipeline ------------------
+async def tools_stage(ctx: ChatContext) -> None:
+    # For tools, keep passing the original history (call_tools can decide how to use it)
+    tool_result = await call_tools(
+        model=ctx.config["base_model"],
+        tools=ctx.config.get("tools", []),
+        message=ctx.user_message,
+        history=ctx.history,
+    )
+    ctx.reply = tool_result["final_answer"]
+
+
+TOOLS_PIPELINE = Pipeline(
+    "tools",
+    [
+        Stage("extract", extract_stage, timeout=30),
+        # Optionally inject file info into the message so tools / model can see it.
+        Stage("assemble", general_assemble_stage, after=("extract",)),
+        Stage("tools", tools_stage, after=("assemble",), timeout=120),
+    ],
+)
+
+
+# ------------------ Dispatch ------------------
+# MODEL_CONFIGS "type" -> pipeline
+PIPELINES: Dict[str, Pipeline] = {
+    "rag-assistant-1": RAG_PIPELINE,
+    "tools-assistant-1": TOOLS_PIPELINE,
+    "general": GENERAL_PIPELINE,
+    "fine_tuned": GENERAL_PIPELINE,
+}
+
 
-async def handle_tools_chat(
+class UnsupportedModelTypeError(ValueError):
+    """
+    Raised when a model config's "type" has no pipeline.
+    """
+
+
+async def run_pipeline(ctx: ChatContext) -> ChatContext:
+    """
+    Run the pipeline registered for `ctx.config["type"]`.
+    Raises UnsupportedModelTypeError for an unknown type.
+    """
+    type_ = ctx.config["type"]
+    pipeline = PIPELINES.get(type_)
+    if pipeline is None:
+        raise UnsupportedModelTypeError(f"Unsupported model type: {type_}")
+    return await pipeline.run(ctx)
+
+
+async def handle_chat(
+    openai_api_key: str,
     config: dict,
     message: str,
     history: list | None,
     file_bytes: Optional[bytes] = None,
     file_name: Optional[str] = None,
     file_mime: Optional[str] = None,
+    retrieved_docs: Optional[list] = None,
+    shards: Optional[List[str]] = None,
+    filters: Optional[dict] = None,
+    bedrock_history: Optional[List[Dict[str, Any]]] = None,
+    system_prompt: Optional[str] = None,
 ) -> str:
-    # Optionally inject file info into the message so tools / model can see it.
-    uploaded_text = extract_text_from_uploaded_file(file_bytes, file_name, file_mime)
-    if uploaded_text:
-        uploaded_excerpt = uploaded_text[:4000]
-        message_for_model = (
-            f"{message}\n\n"
-            f"[The user also uploaded a file named '{file_name}'. "
-            f"Here is an excerpt of its contents:]\n"
-            f"{uploaded_excerpt}"
-        )
-    else:
-        message_for_model = message
-
-    # For tools, keep passing the original history (call_tools can decide how to use it)
-    tool_result = await call_tools(
-        model=config["base_model"],
-        tools=config.get("tools", []),
-        message=message_for_model,
+    """
+    Route a chat to the pipeline for `config["type"]` and return the reply.
+    Pass `bedrock_history` when the history was already converted, and
+    `system_prompt` to replace the backend's own.
+    """
+    ctx = ChatContext(
+        config=config,
+        message=message,
         history=history,
+        openai_api_key=openai_api_key,
+        file_bytes=file_bytes,
+        file_name=file_name,
+        file_mime=file_mime,
+        retrieved_docs=retrieved_docs,
+        shards=shards,
+        filters=filters,
+        bedrock_history=bedrock_history or [],
+        system_prompt=system_prompt,
     )
-    return tool_result["final_answer"]
+    await run_pipeline(ctx)
+    return ctx.reply
@@ -0,0 +1,210 @@
+# app/serialization.py
+"""
+Typed chat request / response bodies and their wire formats.
+
+POST /api/chat/fast takes the whole chat as one JSON or msgpack body:
+
+    {"backendId": "general-assistant-1", "message": "...",
+     "history": [{"from": "user", "text": "..."}, {"from": "bot", "text": "..."}],
+     "shards": ["team-a"], "filters": {"doc_type": "pdf"}}
+
+The body is parsed once (orjson when installed, else json; or msgpack) and
+the top-level fields validated by pydantic. History turns follow the ChatTurn
+schema but are *not* re-validated here: convert_history_for_bedrock checks
+each turn while converting it, so a long history is walked and copied once.
+Request bodies may be sent with `Content-Encoding: gzip` (inflated size capped
+at MAX_DECOMPRESSED_BYTES, 413 beyond it).
+
+Responses are encoded with orjson when installed (msgpack when the client
+asks for it via Accept) and gzip-compressed when the client accepts it and
+the body is large enough to be worth it.
+"""
+
+import gzip
+import json
+import os
+import zlib
+from typing import Any, Dict, List, Literal, Optional
+
+from fastapi.responses import Response
+from pydantic import BaseModel, Field, SkipValidation
+from typing_extensions import TypedDict
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# ------------------ Settings ------------------
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+MSGPACK_MEDIA_TYPES = (MSGPACK_MEDIA_TYPE, "application/x-msgpack", "application/vnd.msgpack")
+
+# Responses smaller than this aren't worth compressing
+GZIP_MIN_BYTES = int(os.getenv("HYPERCHAT_GZIP_MIN_BYTES", "1024"))
+GZIP_LEVEL = 5
+
+# Cap on a gzip request body once inflated (a few KB can expand to GBs)
+MAX_DECOMPRESSED_BYTES = int(os.getenv("HYPERCHAT_MAX_DECOMPRESSED_BYTES", str(32 * 1024 * 1024)))
+
+
+class WireFormatError(ValueError):
+    """
+    Raised for bodies that can't be decoded (bad encoding, bad JSON /
+    msgpack, unsupported media type). `status_code` is the HTTP status to
+    answer with.
+    """
+
+    def __init__(self, message: str, status_code: int = 400) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+
+
+# ------------------ Schema ------------------
+# One history turn, React-style {"from", "text"} or Bedrock-style
+# {"role", "content"}. Other keys ChatPage.jsx keeps on a message
+# (timestamp, file) are ignored.
+ChatTurn = TypedDict(
+    "ChatTurn",
+    {
+        "from": Literal["user", "bot"],
+        "text": Optional[str],
+        "role": Literal["user", "assistant"],
+        "content": Optional[str],
+    },
+    total=False,
+)
+
+
+class ChatRequest(BaseModel):
+    backendId: str
+    message: str = ""
+    # Every ChatTurn constraint is enforced turn by turn in
+    # convert_history_for_bedrock (see module docstring)
+    history: SkipValidation[List[ChatTurn]] = Field(default_factory=list)
+    shards: Optional[List[str]] = None
+    filters: Optional[Dict[str, Any]] = None
+
+
+class ChatResponse(BaseModel):
+    reply: str
+
+
+# ------------------ Requests ------------------
+def _media_type(header: Optional[str]) -> str:
+    return (header or "").split(";", 1)[0].strip().lower()
+
+
+def _import_msgpack():
+    try:
+        import msgpack
+    except ImportError:
+        return None
+    return msgpack
+
+
+def _gunzip(body: bytes, limit: int) -> bytes:
+    # wbits=31: gzip header + trailer. max_length stops inflating at the cap
+    # instead of materialising the whole payload first
+    decompressor = zlib.decompressobj(wbits=31)
+    try:
+        data = decompressor.decompress(body, limit)
+    except zlib.error:
+        raise WireFormatError("Invalid gzip request body")
+    if decompressor.unconsumed_tail or (len(data) >= limit and not decompressor.eof):
+        raise WireFormatError(f"Decompressed request body exceeds {limit} bytes", 413)
+    if not decompressor.eof or decompressor.unused_data:
+        raise WireFormatError("Invalid gzip request body")
+    return data
+
+
+def loads_json(data: Any) -> Any:
+    """
+    Parse JSON text / bytes (orjson when installed). Raises ValueError.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps_json(payload: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def decode_chat_request(
+    body: bytes,
+    content_type: Optional[str],
+    content_encoding: Optional[str] = None,
+) -> ChatRequest:
+    """
+    Decode a JSON or msgpack chat body and validate its top-level fields.
+    Raises WireFormatError for undecodable bodies and pydantic.ValidationError
+    for bodies that don't match ChatRequest.
+    """
+    encoding = (content_encoding or "").strip().lower()
+    if encoding == "gzip":
+        body = _gunzip(body, MAX_DECOMPRESSED_BYTES)
+    elif encoding not in ("", "identity"):
+        raise WireFormatError(f"Unsupported Content-Encoding '{encoding}'", 415)
+
+    media_type = _media_type(content_type) or JSON_MEDIA_TYPE
+    if media_type == JSON_MEDIA_TYPE:
+        try:
+            data = loads_json(body)
+        except ValueError:
+            raise WireFormatError("Invalid JSON request body")
+
+    elif media_type in MSGPACK_MEDIA_TYPES:
+        msgpack = _import_msgpack()
+        if msgpack is None:
+            raise WireFormatError("msgpack bodies need the 'msgpack' package on the server", 415)
+        try:
+            data = msgpack.unpackb(body, raw=False)
+        except (ValueError, TypeError):
+            raise WireFormatError("Invalid msgpack request body")
+
+    else:
+        raise WireFormatError(f"Unsupported Content-Type '{media_type}'", 415)
+
+    return ChatRequest.model_validate(data)
+
+
+# ------------------ Responses ------------------
+def _accepts(header: Optional[str], token: str) -> bool:
+    for part in (header or "").lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if name.strip() == token:
+            return params.replace(" ", "") not in ("q=0", "q=0.0")
+    return False
+
+
+def encode_response(
+    payload: Dict[str, Any],
+    accept: Optional[str] = None,
+    accept_encoding: Optional[str] = None,
+) -> Response:
+    """
+    Encode a response body for the client's Accept / Accept-Encoding headers:
+    msgpack if asked for (and installed), JSON otherwise; gzip when accepted
+    and the body is at least GZIP_MIN_BYTES.
+    """
+    msgpack = None
+    if any(_accepts(accept, media_type) for media_type in MSGPACK_MEDIA_TYPES):
+        msgpack = _import_msgpack()
+
+    if msgpack is not None:
+        body = msgpack.packb(payload, use_bin_type=True)
+        media_type = MSGPACK_MEDIA_TYPE
+    else:
+        body = dumps_json(payload)
+        media_type = JSON_MEDIA_TYPE
+
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if len(body) >= GZIP_MIN_BYTES and _accepts(accept_encoding, "gzip"):
+        body = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+        headers["Content-Encoding"] = "gzip"
+
+    return Response(content=body, media_type=media_type, headers=headers)
@@ -0,0 +1,256 @@
+# app/shards.py
+"""
+Multi-index (sharded) retrieval with metadata pre-filtering.
+
+A RAG backend may list several FAISS stores instead of one:
+
+    "vector_stores": {"team-a": r"...\\team-a", "team-b": r"...\\team-b"},
+    "default_shards": ["team-a"],   # optional; all shards when omitted
+
+Each request can pick shards and filters:
+
+    shards=["team-a", "team-b"]
+    filters={"tenant": "team-a", "doc_type": ["pdf", "md"],
+             "source": "Prompt Injection Attacks.pdf",
+             "date_from": "2025-01-01", "date_to": "2025-12-31"}
+
+Filters are applied *before* the vector search (FAISS IDSelector over the
+positions a per-shard metadata index allows), so a narrow filter still
+returns k hits. Shards are searched in parallel and merged into one top-k.
+"""
+
+import asyncio
+import copy
+import heapq
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+
+# ------------------ Settings ------------------
+DEFAULT_SHARD = "default"
+
+# filter key -> document metadata key
+FILTER_FIELDS = {
+    "source": "source_name",
+    "tenant": "tenant",
+    "doc_type": "doc_type",
+}
+DATE_FIELD = "date"  # ISO "YYYY-MM-DD", compared as strings
+DATE_FILTERS = ("date_from", "date_to")
+
+
+class ShardSelectionError(ValueError):
+    """
+    Raised for unknown shards or malformed filters in a request.
+    """
+
+
+# ------------------ Config ------------------
+def shard_paths(config: dict) -> Dict[str, str]:
+    """
+    Shard name -> store path for a RAG config ("vector_stores", or the single
+    legacy "vector_store" as shard "default").
+    """
+    if config.get("vector_stores"):
+        return dict(config["vector_stores"])
+    if config.get("vector_store"):
+        return {DEFAULT_SHARD: config["vector_store"]}
+    return {}
+
+
+def resolve_shards(config: dict, requested: Optional[Sequence[str]]) -> List[str]:
+    paths = shard_paths(config)
+    if not requested:
+        return list(config.get("default_shards") or paths)
+    unknown = [name for name in requested if name not in paths]
+    if unknown:
+        raise ShardSelectionError(f"Unknown shards: {', '.join(unknown)}")
+    # Keep request order, drop repeats
+    return list(dict.fromkeys(requested))
+
+
+def validate_filters(filters: Optional[dict]) -> Optional[dict]:
+    if not filters:
+        return None
+    if not isinstance(filters, dict):
+        raise ShardSelectionError("filters must be a JSON object")
+    for key, value in filters.items():
+        if key in FILTER_FIELDS:
+            values = value if isinstance(value, list) else [value]
+            if not all(isinstance(v, str) for v in values):
+                raise ShardSelectionError(f"Filter '{key}' must be a string or list of strings")
+        elif key in DATE_FILTERS:
+            if not isinstance(value, str):
+                raise ShardSelectionError(f"Filter '{key}' must be an ISO date string")
+        else:
+            raise ShardSelectionError(f"Unknown filter '{key}'")
+    return filters
+
+
+# ------------------ Metadata Index ------------------
+class MetadataIndex:
+    """
+    Inverted index over one FAISS store's documents.
+
+    A deduplicated document stands for every place its text appeared
+    (metadata["sources"], see dedup.py), so each provenance entry is indexed
+    on its own: field -> value -> entry ids, plus entry ids sorted by date.
+    A document matches when one of its entries matches every filter.
+    """
+
+    def __init__(self, store: Any) -> None:
+        self.size = 0
+        self._positions: List[int] = []  # entry id -> FAISS position
+        self._values: Dict[str, Dict[str, List[int]]] = {f: {} for f in FILTER_FIELDS}
+        self._dates: List[Tuple[str, int]] = []
+
+        for position, doc_id in store.index_to_docstore_id.items():
+            doc = store.docstore.search(doc_id)
+            metadata = getattr(doc, "metadata", None) or {}
+            self.size += 1
+            entries = metadata.get("sources") or [metadata]
+            for entry in entries:
+                entry_id = len(self._positions)
+                self._positions.append(position)
+                for filter_key, meta_key in FILTER_FIELDS.items():
+                    value = entry.get(meta_key)
+                    if value is not None:
+                        self._values[filter_key].setdefault(str(value), []).append(entry_id)
+                if entry.get(DATE_FIELD):
+                    self._dates.append((str(entry[DATE_FIELD]), entry_id))
+        self._dates.sort()
+
+    def select(self, filters: Optional[dict]) -> Optional[List[int]]:
+        """
+        Sorted positions matching every filter, or None when unfiltered.
+        """
+        if not filters:
+            return None
+
+        allowed: Optional[set] = None
+        for filter_key in FILTER_FIELDS:
+            if filter_key not in filters:
+                continue
+            wanted = filters[filter_key]
+            wanted = wanted if isinstance(wanted, list) else [wanted]
+            matches = set()
+            for value in wanted:
+                matches.update(self._values[filter_key].get(value, ()))
+            allowed = matches if allowed is None else allowed & matches
+
+        if any(key in filters for key in DATE_FILTERS):
+            low = filters.get("date_from", "")
+            high = filters.get("date_to", "\uffff")
+            matches = {entry_id for date, entry_id in self._dates if low <= date <= high}
+            allowed = matches if allowed is None else allowed & matches
+
+        return sorted({self._positions[entry_id] for entry_id in allowed or ()})
+
+
+_index_lock = threading.Lock()
+_metadata_indexes: Dict[int, Tuple[Any, MetadataIndex]] = {}
+
+
+def get_metadata_index(store: Any) -> MetadataIndex:
+    """
+    MetadataIndex for a loaded store, built once (stores are cached, so
+    keying on identity is stable).
+    """
+    entry = _metadata_indexes.get(id(store))
+    if entry is None or entry[0] is not store:
+        with _index_lock:
+            entry = _metadata_indexes.get(id(store))
+            if entry is None or entry[0] is not store:
+                entry = (store, MetadataIndex(store))
+                _metadata_indexes[id(store)] = entry
+    return entry[1]
+
+
+# ------------------ Search ------------------
+@dataclass
+class Shard:
+    name: str
+    store: Any
+
+
+def _higher_is_better(store: Any) -> bool:
+    strategy = getattr(store, "distance_strategy", None)
+    return "INNER_PRODUCT" in str(getattr(strategy, "value", strategy) or "").upper()
+
+
+def search_shard(shard: Shard, vector: Sequence[float], k: int, filters: Optional[dict]) -> List[Tuple[Any, float]]:
+    """
+    Top-k (document, score) from one shard, pre-filtered by metadata.
+    Blocking; FAISS releases the GIL, so shards searched from threads
+    really run in parallel.
+    """
+    import faiss
+    import numpy as np
+
+    store = shard.store
+    query = np.array([vector], dtype=np.float32)
+    if getattr(store, "_normalize_L2", False):
+        faiss.normalize_L2(query)
+
+    allowed = get_metadata_index(store).select(filters) if filters else None
+    if allowed is not None and not allowed:
+        return []
+
+    if allowed is None:
+        scores, positions = store.index.search(query, k)
+    else:
+        ids = np.array(allowed, dtype=np.int64)
+        k = min(k, len(ids))
+        try:
+            params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(ids))
+            scores, positions = store.index.search(query, k, params=params)
+        except (AttributeError, RuntimeError, TypeError):
+            # Older FAISS / index type without selector support: score the
+            # allowed vectors directly
+            vectors = store.index.reconstruct_batch(ids)
+            if _higher_is_better(store):
+                raw = vectors @ query[0]
+                order = np.argsort(-raw)[:k]
+            else:
+                raw = ((vectors - query[0]) ** 2).sum(axis=1)
+                order = np.argsort(raw)[:k]
+            scores, positions = raw[order][None, :], ids[order][None, :]
+
+    results = []
+    for score, position in zip(scores[0], positions[0]):
+        if position == -1:
+            continue
+        doc = store.docstore.search(store.index_to_docstore_id[int(position)])
+        results.append((doc, float(score)))
+    return results
+
+
+async def search_shards(
+    shards: Sequence[Shard],
+    vector: Sequence[float],
+    k: int,
+    filters: Optional[dict] = None,
+) -> List[Any]:
+    """
+    Search every shard in parallel and merge into one top-k list of
+    documents, each tagged with metadata["shard"].
+    """
+    per_shard = await asyncio.gather(
+        *(asyncio.to_thread(search_shard, shard, vector, k, filters) for shard in shards)
+    )
+
+    higher_is_better = bool(shards) and _higher_is_better(shards[0].store)
+    merged = []
+    for shard, hits in zip(shards, per_shard):
+        for rank, (doc, score) in enumerate(hits):
+            merged.append((-score if higher_is_better else score, rank, shard.name, doc))
+
+    results = []
+    for _, _, shard_name, doc in heapq.nsmallest(k, merged, key=lambda m: (m[0], m[1])):
+        if len(shards) > 1:
+            # Tag on a copy: the document object lives in the cached store
+            doc = copy.copy(doc)
+            doc.metadata = {**doc.metadata, "shard": shard_name}
+        results.append(doc)
+    return results
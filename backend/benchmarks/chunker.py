@@ -0,0 +1,121 @@
+# benchmarks/chunker.py
+"""
+Extraction + chunking throughput on the `knowledge base` PDFs, in pages/sec:
+
+- app.documents (PyMuPDF or pypdf) with structure-aware token chunking
+- LangChain PyPDFLoader + RecursiveCharacterTextSplitter(800, 100)
+- LangChain UnstructuredPDFLoader + RecursiveCharacterTextSplitter(800, 100)
+
+Loaders that aren't installed are skipped. Run from the `backend` directory:
+    python -m benchmarks.chunker --repeat 3
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_KB_DIR = os.path.join(
+    os.path.dirname(BACKEND_DIR), "pipelines", "rag-assistant-1", "knowledge base"
+)
+
+
+def _shared_chunker(path: str) -> int:
+    from app.documents import iter_file_chunks
+
+    return sum(1 for _ in iter_file_chunks(path))
+
+
+def _langchain(loader_name: str) -> Callable[[str], int]:
+    def run(path: str) -> int:
+        import langchain_community.document_loaders as loaders
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+        docs = getattr(loaders, loader_name)(path).load()
+        return len(RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=100).split_documents(docs))
+
+    return run
+
+
+def _page_count(path: str) -> int:
+    # Counted once up front, outside the timed runs
+    from app.documents import _pdf_pages
+
+    with open(path, "rb") as f:
+        return sum(1 for _ in _pdf_pages(f.read()))
+
+
+def _available(name: str) -> bool:
+    try:
+        if name == "shared":
+            import app.documents  # noqa: F401
+
+            try:
+                import fitz  # noqa: F401
+            except ImportError:
+                import pypdf  # noqa: F401
+        elif name == "PyPDFLoader":
+            import pypdf  # noqa: F401
+            import langchain_community  # noqa: F401
+        else:
+            import unstructured  # noqa: F401
+            import langchain_community  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def bench(fn: Callable[[str], int], pdfs: List[str], pages: int, repeat: int) -> Dict[str, float]:
+    best = None
+    chunks = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        chunks = sum(fn(path) for path in pdfs)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return {"pages": pages, "chunks": chunks, "seconds": best, "pages_per_sec": pages / best if best else 0.0}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="PDF extraction + chunking throughput")
+    parser.add_argument("--kb-dir", default=DEFAULT_KB_DIR)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+
+    pdfs = sorted(glob.glob(os.path.join(args.kb_dir, "**", "*.pdf"), recursive=True))
+    if not pdfs:
+        print(f"No PDFs found under {args.kb_dir}")
+        return
+
+    if not _available("shared"):
+        print("Neither PyMuPDF nor pypdf is installed")
+        return
+    pages = sum(_page_count(path) for path in pdfs)
+
+    candidates = [
+        ("app.documents", "shared", _shared_chunker),
+        ("PyPDFLoader", "PyPDFLoader", _langchain("PyPDFLoader")),
+        ("UnstructuredPDFLoader", "UnstructuredPDFLoader", _langchain("UnstructuredPDFLoader")),
+    ]
+
+    print(f"\n========== PDF extraction + chunking ({len(pdfs)} files) ==========")
+    for label, requirement, fn in candidates:
+        if not _available(requirement):
+            print(f"{label:<24} skipped (not installed)")
+            continue
+        r = bench(fn, pdfs, pages, args.repeat)
+        print(
+            f"{label:<24} pages={r['pages']:>5}  chunks={r['chunks']:>6}  "
+            f"best={r['seconds']:.3f}s  {r['pages_per_sec']:>8.1f} pages/sec"
+        )
+
+
+if __name__ == "__main__":
+    main()
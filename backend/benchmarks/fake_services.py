@@ -0,0 +1,184 @@
+# benchmarks/fake_services.py
+"""
+Local stand-ins for the two remote APIs the backend depends on, so the app can
+be load-tested without spending Bedrock / OpenAI quota:
+
+- Bedrock Runtime  POST /model/{modelId}/converse
+- OpenAI           POST /v1/embeddings
+
+Point the backend at it with:
+    BEDROCK_ENDPOINT_URL=http://127.0.0.1:8700
+    OPENAI_BASE_URL=http://127.0.0.1:8700/v1   (and OPENAI_API_BASE for langchain)
+
+Run standalone:
+    python -m benchmarks.fake_services --port 8700 --bedrock-latency lognormal:400,0.4
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import math
+import re
+import struct
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from .stats import LatencyDistribution
+
+
+EMBEDDING_DIM = 1536
+_WORD_RE = re.compile(r"\w+")
+
+
+# ------------------ Fake Embeddings ------------------
+def fake_embedding(item: Any, dim: int = EMBEDDING_DIM) -> List[float]:
+    """
+    Deterministic hashed bag-of-words embedding. Texts sharing words end up
+    close together, which keeps FAISS search results meaningful in benchmarks.
+    Accepts either a string or a list of token ids (what OpenAIEmbeddings sends
+    when it pre-tokenizes with tiktoken).
+    """
+    if isinstance(item, str):
+        tokens = [t.lower() for t in _WORD_RE.findall(item)]
+    else:
+        tokens = [str(t) for t in item]
+
+    vec = [0.0] * dim
+    for tok in tokens or [""]:
+        digest = hashlib.blake2b(tok.encode("utf-8"), digest_size=8).digest()
+        h = int.from_bytes(digest, "little")
+        vec[h % dim] += 1.0 if (h >> 63) & 1 else -1.0
+
+    norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+    return [v / norm for v in vec]
+
+
+# ------------------ Fake Replies ------------------
+def _last_user_text(body: Dict[str, Any]) -> str:
+    for msg in reversed(body.get("messages") or []):
+        if msg.get("role") == "user":
+            return "".join(c.get("text", "") for c in msg.get("content", []))
+    return ""
+
+
+def _fake_reply(body: Dict[str, Any], reply_words: int) -> str:
+    prompt = _last_user_text(body)
+    seed = hashlib.sha1(prompt.encode("utf-8")).hexdigest()
+    words = [f"token{seed[i % len(seed)]}{i}" for i in range(reply_words)]
+    return "[fake-bedrock] " + " ".join(words)
+
+
+def _input_tokens(body: Dict[str, Any]) -> int:
+    # Rough 4-chars-per-token estimate, good enough for usage bookkeeping
+    chars = 0
+    for msg in body.get("messages") or []:
+        for c in msg.get("content", []):
+            chars += len(c.get("text", ""))
+    for s in body.get("system") or []:
+        chars += len(s.get("text", ""))
+    return max(1, chars // 4)
+
+
+# ------------------ App Factory ------------------
+def create_app(
+    bedrock_latency: str = "constant:300",
+    embedding_latency: str = "constant:50",
+    reply_words: int = 64,
+    seed: Optional[int] = None,
+) -> FastAPI:
+    """
+    Build the stand-in app. Latency specs use the LatencyDistribution format.
+    """
+    bedrock_dist = LatencyDistribution(bedrock_latency, seed=seed)
+    embedding_dist = LatencyDistribution(embedding_latency, seed=seed)
+
+    app = FastAPI()
+
+    @app.post("/model/{model_id:path}/converse")
+    async def converse(model_id: str, request: Request):
+        body = await request.json()
+        latency = bedrock_dist.sample()
+        await asyncio.sleep(latency)
+
+        text = _fake_reply(body, reply_words)
+        input_tokens = _input_tokens(body)
+        return JSONResponse(
+            {
+                "output": {"message": {"role": "assistant", "content": [{"text": text}]}},
+                "stopReason": "end_turn",
+                "usage": {
+                    "inputTokens": input_tokens,
+                    "outputTokens": reply_words,
+                    "totalTokens": input_tokens + reply_words,
+                },
+                "metrics": {"latencyMs": int(latency * 1000)},
+            }
+        )
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        await asyncio.sleep(embedding_dist.sample())
+
+        inputs = body.get("input") or []
+        # A single string / single token list is allowed by the OpenAI API
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+
+        dim = int(body.get("dimensions") or EMBEDDING_DIM)
+        as_base64 = body.get("encoding_format") == "base64"
+
+        data = []
+        total_tokens = 0
+        for i, item in enumerate(inputs):
+            vec = fake_embedding(item, dim)
+            total_tokens += len(item) if not isinstance(item, str) else max(1, len(item) // 4)
+            if as_base64:
+                encoded: Any = base64.b64encode(struct.pack(f"<{dim}f", *vec)).decode("ascii")
+            else:
+                encoded = vec
+            data.append({"object": "embedding", "index": i, "embedding": encoded})
+
+        return JSONResponse(
+            {
+                "object": "list",
+                "data": data,
+                "model": body.get("model", "text-embedding-ada-002"),
+                "usage": {"prompt_tokens": total_tokens, "total_tokens": total_tokens},
+            }
+        )
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    return app
+
+
+# ------------------ CLI ------------------
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Fake Bedrock + embeddings server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8700)
+    parser.add_argument("--bedrock-latency", default="constant:300")
+    parser.add_argument("--embedding-latency", default="constant:50")
+    parser.add_argument("--reply-words", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    import uvicorn
+
+    app = create_app(
+        bedrock_latency=args.bedrock_latency,
+        embedding_latency=args.embedding_latency,
+        reply_words=args.reply_words,
+        seed=args.seed,
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
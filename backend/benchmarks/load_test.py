@@ -0,0 +1,568 @@
+# benchmarks/load_test.py
+"""
+End-to-end load test for POST /api/chat.
+
+Starts the fake Bedrock / embeddings server, (optionally) builds a small FAISS
+store through it for `rag-assistant-1`, starts the FastAPI app under uvicorn
+pointed at the stand-ins, then replays chat traffic and reports RPS,
+latency percentiles and RSS per worker. /api/chat answers with one JSON
+body once the reply is complete, so latency is measured to the end of the
+response.
+
+Requests are multipart/form-data by default, like ChatPage.jsx's FormData.
+`--body json|msgpack` sends text-only requests to /api/chat/fast instead
+(uploads always stay multipart). Uploads are text, DOCX or PDF
+(--upload-kinds); --upload-sizes is the size of their text in bytes, and the
+default includes sizes above the app's 64KB inline-extraction limit, so the
+extraction process pool is exercised too.
+
+Run from the `backend` directory:
+    python -m benchmarks.load_test --requests 500 --concurrency 32 --workers 2
+
+Traffic can be synthetic (--mix / --history-turns / --upload-sizes /
+--upload-kinds) or replayed from a JSONL trace where each line looks like:
+    {"backendId": "rag-assistant-1", "history_turns": 6, "upload_bytes": 4096,
+     "upload_kind": "pdf", "message": "..."}
+
+Note: OpenAIEmbeddings tokenizes with tiktoken before calling the API. On an
+offline machine, pre-populate TIKTOKEN_CACHE_DIR or the RAG requests will fail.
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from .stats import child_pids, format_summary, process_cmdline, rss_bytes, summarize
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SAMPLE_QUESTIONS = [
+    "What is a prompt injection attack?",
+    "List 5 things that I can do to stop a prompt injection attack",
+    "How should API keys be stored for an LLM application?",
+    "Summarize the uploaded document.",
+    "What are the main LLM security risks in 2025?",
+    "Explain data poisoning in simple terms.",
+]
+
+KB_SNIPPETS = [
+    "Prompt injection attacks manipulate a model by embedding instructions in untrusted input.",
+    "Never place secrets or API keys in system prompts; use a secrets manager instead.",
+    "Data poisoning corrupts training or retrieval corpora to bias model outputs.",
+    "Output filtering and least-privilege tool access reduce the blast radius of jailbreaks.",
+    "Rate limiting and anomaly detection help catch automated abuse of LLM endpoints.",
+    "Retrieval-augmented generation grounds answers in a curated knowledge base.",
+]
+
+
+# ------------------ Traffic Generation ------------------
+def parse_mix(spec: str) -> List[Tuple[str, float]]:
+    """
+    "general-assistant-1=0.6,rag-assistant-1=0.3" -> [(id, weight), ...]
+    """
+    mix: List[Tuple[str, float]] = []
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition("=")
+        mix.append((name.strip(), float(weight or 1)))
+    if not mix:
+        raise ValueError("Mix cannot be empty")
+    return mix
+
+
+def parse_int_list(spec: str) -> List[int]:
+    return [int(v) for v in spec.split(",") if v.strip()]
+
+
+def build_history(turns: int, rng: random.Random) -> List[Dict[str, str]]:
+    """
+    React-style history as ChatPage.jsx sends it.
+    """
+    history = []
+    for i in range(turns):
+        if i % 2 == 0:
+            history.append({"from": "user", "text": rng.choice(SAMPLE_QUESTIONS)})
+        else:
+            history.append({"from": "bot", "text": " ".join(rng.choices(KB_SNIPPETS, k=3))})
+    return history
+
+
+UPLOAD_KINDS = ("txt", "docx", "pdf")
+DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+# (kind, size) -> upload, built once before the run so it isn't timed
+_uploads: Dict[Tuple[str, int], Tuple[str, bytes, str]] = {}
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _pdf_bytes(lines: List[str], lines_per_page: int = 50) -> bytes:
+    """
+    Minimal text-only PDF (Helvetica, one line per row), so PDF uploads don't
+    need a PDF writer installed.
+    """
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[]]
+    font_id = 3
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        font_id: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+    kids = []
+    for i, page_lines in enumerate(pages):
+        page_id, content_id = 4 + 2 * i, 5 + 2 * i
+        kids.append(f"{page_id} 0 R")
+        stream = "BT /F1 10 Tf 12 TL 40 800 Td " + " ".join(
+            f"({_pdf_escape(line)}) Tj T*" for line in page_lines
+        ) + " ET"
+        data = stream.encode("latin-1", errors="replace")
+        objects[page_id] = (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {content_id} 0 R >>"
+        ).encode("ascii")
+        objects[content_id] = b"<< /Length %d >>\nstream\n" % len(data) + data + b"\nendstream"
+    objects[2] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(pages)} >>".encode("ascii")
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = {}
+    for obj_id in sorted(objects):
+        offsets[obj_id] = out.tell()
+        out.write(b"%d 0 obj\n" % obj_id + objects[obj_id] + b"\nendobj\n")
+    xref = out.tell()
+    count = max(objects) + 1
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % count)
+    for obj_id in range(1, count):
+        out.write(b"%010d 00000 n \n" % offsets[obj_id])
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (count, xref))
+    return out.getvalue()
+
+
+def _docx_bytes(lines: List[str]) -> bytes:
+    from docx import Document
+
+    doc = Document()
+    doc.add_heading("Notes", 1)
+    for line in lines:
+        doc.add_paragraph(line)
+    buf = io.BytesIO()
+    doc.save(buf)
+    return buf.getvalue()
+
+
+def build_upload(size: int, rng: random.Random, kind: str = "txt") -> Optional[Tuple[str, bytes, str]]:
+    """
+    A (file name, bytes, mime) upload whose text is about `size` bytes.
+    """
+    if size <= 0:
+        return None
+    upload = _uploads.get((kind, size))
+    if upload is not None:
+        return upload
+
+    lines: List[str] = []
+    total = 0
+    while total < size:
+        lines.append(rng.choice(KB_SNIPPETS))
+        total += len(lines[-1]) + 1
+
+    if kind == "pdf":
+        upload = ("notes.pdf", _pdf_bytes(lines), "application/pdf")
+    elif kind == "docx":
+        upload = ("notes.docx", _docx_bytes(lines), DOCX_MIME)
+    else:
+        upload = ("notes.txt", "\n".join(lines)[:size].encode("utf-8"), "text/plain")
+    _uploads[(kind, size)] = upload
+    return upload
+
+
+def synthetic_requests(
+    count: int,
+    mix: List[Tuple[str, float]],
+    history_turns: List[int],
+    upload_sizes: List[int],
+    upload_kinds: List[Tuple[str, float]],
+    seed: int,
+) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    names = [m[0] for m in mix]
+    weights = [m[1] for m in mix]
+    kinds = [k[0] for k in upload_kinds]
+    kind_weights = [k[1] for k in upload_kinds]
+    items = []
+    for _ in range(count):
+        items.append(
+            {
+                "backendId": rng.choices(names, weights=weights)[0],
+                "message": rng.choice(SAMPLE_QUESTIONS),
+                "history_turns": rng.choice(history_turns),
+                "upload_bytes": rng.choice(upload_sizes),
+                "upload_kind": rng.choices(kinds, weights=kind_weights)[0],
+            }
+        )
+    return items
+
+
+def trace_requests(path: str, count: Optional[int]) -> List[Dict[str, Any]]:
+    items = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                items.append(json.loads(line))
+    if count:
+        # Cycle through the trace until we have enough requests
+        items = [items[i % len(items)] for i in range(count)]
+    return items
+
+
+# ------------------ Process Management ------------------
+def _wait_for_http(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    last_error: Optional[Exception] = None
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError as e:
+            last_error = e
+        time.sleep(0.2)
+    raise RuntimeError(f"Timed out waiting for {url}: {last_error}")
+
+
+def start_fake_services(args: argparse.Namespace) -> subprocess.Popen:
+    cmd = [
+        sys.executable, "-m", "benchmarks.fake_services",
+        "--port", str(args.fake_port),
+        "--bedrock-latency", args.bedrock_latency,
+        "--embedding-latency", args.embedding_latency,
+        "--seed", str(args.seed),
+    ]
+    proc = subprocess.Popen(cmd, cwd=BACKEND_DIR)
+    _wait_for_http(f"http://127.0.0.1:{args.fake_port}/health")
+    return proc
+
+
+def build_fake_vector_store(fake_url: str, out_dir: str) -> str:
+    """
+    Build a small FAISS store through the fake embeddings endpoint so the RAG
+    pipeline has something to load.
+    """
+    from langchain_community.vectorstores import FAISS
+    from langchain_openai import OpenAIEmbeddings
+
+    embeddings = OpenAIEmbeddings(
+        api_key="fake",
+        base_url=f"{fake_url}/v1",
+        check_embedding_ctx_length=False,
+    )
+    texts = [f"{snippet} (section {i})" for i in range(50) for snippet in KB_SNIPPETS]
+    store = FAISS.from_texts(texts, embeddings)
+    path = os.path.join(out_dir, "vectorstore_db")
+    store.save_local(path)
+    return path
+
+
+def app_env(args: argparse.Namespace, vector_store: Optional[str]) -> Dict[str, str]:
+    fake_url = f"http://127.0.0.1:{args.fake_port}"
+    env = dict(os.environ)
+    env.update(
+        {
+            "BEDROCK_ENDPOINT_URL": fake_url,
+            "OPENAI_BASE_URL": f"{fake_url}/v1",
+            "OPENAI_API_BASE": f"{fake_url}/v1",
+            "OPENAI_API_KEY": "fake",
+            "AWS_ACCESS_KEY_ID": "fake",
+            "AWS_SECRET_ACCESS_KEY": "fake",
+            "AWS_REGION": "us-east-1",
+        }
+    )
+    if vector_store:
+        env["RAG_ASSISTANT_1_VECTOR_STORE"] = vector_store
+    return env
+
+
+def start_app(args: argparse.Namespace, env: Dict[str, str]) -> subprocess.Popen:
+    cmd = [
+        sys.executable, "-m", "uvicorn", "app.main:app",
+        "--port", str(args.app_port),
+        "--workers", str(args.workers),
+        "--log-level", "warning",
+    ]
+    proc = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env)
+    _wait_for_http(f"http://127.0.0.1:{args.app_port}/openapi.json", timeout=60.0)
+    return proc
+
+
+def _is_uvicorn_worker(pid: int) -> bool:
+    # uvicorn starts --workers processes with the spawn start method; the
+    # master's other children (multiprocessing's resource tracker) don't serve
+    return any("spawn_main" in arg for arg in process_cmdline(pid))
+
+
+def worker_memory(master_pid: int, workers: int = 1) -> Dict[int, int]:
+    """
+    RSS of the processes serving requests. With --workers 1 uvicorn serves
+    from the master itself and its children are the app's extraction pool,
+    so only the master is sampled.
+    """
+    if workers == 1:
+        pids = [master_pid]
+    else:
+        pids = [pid for pid in child_pids(master_pid) if _is_uvicorn_worker(pid)] or [master_pid]
+    memory = {}
+    for pid in pids:
+        rss = rss_bytes(pid)
+        if rss is not None:
+            memory[pid] = rss
+    return memory
+
+
+# ------------------ Load Generation ------------------
+def _request_kwargs(
+    url: str,
+    item: Dict[str, Any],
+    rng: random.Random,
+    body: str,
+) -> Dict[str, Any]:
+    history = item.get("history") or build_history(int(item.get("history_turns", 0)), rng)
+    message = item.get("message") or rng.choice(SAMPLE_QUESTIONS)
+    upload = build_upload(int(item.get("upload_bytes", 0)), rng, item.get("upload_kind", "txt"))
+
+    if upload or body == "multipart":
+        # Text fields go in `files` as (None, value) parts: with only `data`,
+        # httpx sends application/x-www-form-urlencoded, not multipart
+        fields = {"backendId": item["backendId"], "message": message, "history": json.dumps(history)}
+        files: Dict[str, Any] = {name: (None, value) for name, value in fields.items()}
+        if upload:
+            files["file"] = upload
+        return {"url": url, "files": files}
+
+    payload = {"backendId": item["backendId"], "message": message, "history": history}
+    if body == "msgpack":
+        import msgpack
+
+        content, content_type = msgpack.packb(payload), "application/msgpack"
+    else:
+        content, content_type = json.dumps(payload).encode("utf-8"), "application/json"
+    return {
+        "url": url.rstrip("/") + "/fast",
+        "content": content,
+        "headers": {"Content-Type": content_type, "Accept": content_type},
+    }
+
+
+async def _send_one(
+    client: httpx.AsyncClient,
+    url: str,
+    item: Dict[str, Any],
+    rng: random.Random,
+    body: str = "multipart",
+) -> Dict[str, Any]:
+    request = _request_kwargs(url, item, rng, body)
+
+    started = time.perf_counter()
+    try:
+        response = await client.post(**request)
+        status = response.status_code
+    except httpx.HTTPError as e:
+        return {"backendId": item["backendId"], "ok": False, "status": 0, "error": str(e),
+                "latency": time.perf_counter() - started}
+
+    return {
+        "backendId": item["backendId"],
+        "ok": status == 200,
+        "status": status,
+        "latency": time.perf_counter() - started,
+    }
+
+
+async def run_load(
+    url: str,
+    items: List[Dict[str, Any]],
+    concurrency: int,
+    seed: int,
+    master_pid: Optional[int] = None,
+    body: str = "multipart",
+    workers: int = 1,
+) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in items:
+        build_upload(int(item.get("upload_bytes", 0)), rng, item.get("upload_kind", "txt"))
+        queue.put_nowait(item)
+
+    results: List[Dict[str, Any]] = []
+    memory_samples: Dict[int, List[int]] = {}
+
+    async def worker(client: httpx.AsyncClient) -> None:
+        while True:
+            try:
+                item = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            results.append(await _send_one(client, url, item, rng, body))
+
+    async def sample_memory(stop: asyncio.Event) -> None:
+        while not stop.is_set():
+            for pid, rss in worker_memory(master_pid, workers).items():
+                memory_samples.setdefault(pid, []).append(rss)
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=0.5)
+            except asyncio.TimeoutError:
+                pass
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_memory(stop)) if master_pid else None
+
+    started = time.perf_counter()
+    async with httpx.AsyncClient(timeout=120.0, limits=limits) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    if sampler:
+        await sampler
+
+    return {"results": results, "elapsed": elapsed, "memory": memory_samples}
+
+
+def report(run: Dict[str, Any]) -> Dict[str, Any]:
+    results = run["results"]
+    elapsed = run["elapsed"]
+    ok = [r for r in results if r["ok"]]
+
+    summary: Dict[str, Any] = {
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "elapsed_s": elapsed,
+        "rps": len(ok) / elapsed if elapsed else 0.0,
+        "latency": summarize([r["latency"] for r in ok]),
+        "by_backend": {},
+        "status_codes": {},
+        "worker_rss_mb": {},
+    }
+
+    for r in results:
+        code = str(r["status"])
+        summary["status_codes"][code] = summary["status_codes"].get(code, 0) + 1
+
+    for backend in sorted({r["backendId"] for r in ok}):
+        summary["by_backend"][backend] = summarize(
+            [r["latency"] for r in ok if r["backendId"] == backend]
+        )
+
+    for pid, samples in run["memory"].items():
+        summary["worker_rss_mb"][str(pid)] = {
+            "peak": max(samples) / 1e6,
+            "last": samples[-1] / 1e6,
+        }
+
+    print("\n========== Load Test ==========")
+    print(f"Requests: {summary['requests']}   Errors: {summary['errors']}   "
+          f"Elapsed: {elapsed:.2f}s   RPS: {summary['rps']:.1f}")
+    print(f"Status codes: {summary['status_codes']}")
+    print(format_summary("latency (all)", summary["latency"]))
+    for backend, s in summary["by_backend"].items():
+        print(format_summary(f"latency [{backend}]", s))
+    for pid, mem in summary["worker_rss_mb"].items():
+        print(f"worker pid={pid}: peak RSS {mem['peak']:.1f} MB, last {mem['last']:.1f} MB")
+    print("===============================")
+    return summary
+
+
+# ------------------ CLI ------------------
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Load test /api/chat against local stand-ins")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--app-port", type=int, default=4100)
+    parser.add_argument("--fake-port", type=int, default=8700)
+    parser.add_argument("--bedrock-latency", default="lognormal:400,0.4")
+    parser.add_argument("--embedding-latency", default="lognormal:40,0.3")
+    parser.add_argument("--mix", default="general-assistant-1=0.5,rag-assistant-1=0.4,tools-assistant-1=0.1")
+    parser.add_argument("--history-turns", default="0,2,6,12,40")
+    parser.add_argument("--upload-sizes", default="0,0,0,2048,65536,262144",
+                        help="Upload text sizes in bytes (0 = no upload)")
+    parser.add_argument("--upload-kinds", default="txt=0.5,docx=0.3,pdf=0.2",
+                        help=f"Weighted upload formats, from {', '.join(UPLOAD_KINDS)}")
+    parser.add_argument("--body", choices=["multipart", "json", "msgpack"], default="multipart",
+                        help="Encoding for requests without an upload")
+    parser.add_argument("--trace", help="JSONL trace to replay instead of synthetic traffic")
+    parser.add_argument("--no-rag-store", action="store_true",
+                        help="Don't build a fake FAISS store (use the configured one)")
+    parser.add_argument("--url", help="Target an already-running app instead of starting one")
+    parser.add_argument("--json", dest="json_out", help="Write the summary to this JSON file")
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args(argv)
+
+    upload_kinds = parse_mix(args.upload_kinds)
+    unknown = [kind for kind, _ in upload_kinds if kind not in UPLOAD_KINDS]
+    if unknown:
+        parser.error(f"Unknown upload kinds {unknown}; choose from {', '.join(UPLOAD_KINDS)}")
+    try:
+        import docx  # noqa: F401
+    except ImportError:
+        print("python-docx not installed; sending DOCX uploads as text")
+        upload_kinds = [("txt" if kind == "docx" else kind, w) for kind, w in upload_kinds]
+
+    if args.trace:
+        items = trace_requests(args.trace, args.requests)
+    else:
+        items = synthetic_requests(
+            args.requests,
+            parse_mix(args.mix),
+            parse_int_list(args.history_turns),
+            parse_int_list(args.upload_sizes),
+            upload_kinds,
+            args.seed,
+        )
+
+    procs: List[subprocess.Popen] = []
+    master_pid: Optional[int] = None
+    try:
+        if args.url:
+            url = args.url
+        else:
+            procs.append(start_fake_services(args))
+            vector_store = None
+            tmp_dir = tempfile.mkdtemp(prefix="hyperchat-bench-")
+            if not args.no_rag_store:
+                vector_store = build_fake_vector_store(f"http://127.0.0.1:{args.fake_port}", tmp_dir)
+
+            app_proc = start_app(args, app_env(args, vector_store))
+            procs.append(app_proc)
+            master_pid = app_proc.pid
+            url = f"http://127.0.0.1:{args.app_port}/api/chat"
+
+        run = asyncio.run(run_load(url, items, args.concurrency, args.seed, master_pid, args.body, args.workers))
+        summary = report(run)
+
+        if args.json_out:
+            with open(args.json_out, "w", encoding="utf-8") as f:
+                json.dump(summary, f, indent=2)
+    finally:
+        for proc in reversed(procs):
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+if __name__ == "__main__":
+    main()
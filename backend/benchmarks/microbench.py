@@ -0,0 +1,313 @@
+# benchmarks/microbench.py
+"""
+Microbenchmarks for the hot helpers on the /api/chat path:
+
+- convert_history_for_bedrock      (history lengths 10 / 100 / 1000)
+- chat request decoding            (multipart history string vs JSON / msgpack
+                                    bodies, 10 / 100 / 1000 turns, incl. conversion)
+- chat response encoding           (json vs orjson, gzip)
+- extract_text_from_uploaded_file  (text + DOCX uploads)
+- FAISS similarity search          (flat L2 index, 1536-dim)
+
+Run from the `backend` directory:
+    python -m benchmarks.microbench --json bench.json
+    python -m benchmarks.microbench --baseline bench.json --tolerance 0.25
+
+With --baseline, exits non-zero when any p50 regresses by more than the
+tolerance, so it can run in CI.
+"""
+
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from .stats import format_summary, summarize
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# ------------------ Harness ------------------
+def bench(fn: Callable[[], Any], repeat: int, warmup: int = 3) -> Dict[str, float]:
+    for _ in range(warmup):
+        fn()
+    samples: List[float] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+def _history(turns: int, rng: random.Random) -> List[Dict[str, str]]:
+    history = []
+    for i in range(turns):
+        text = " ".join(rng.choice(["alpha", "beta", "gamma", "delta"]) for _ in range(40))
+        history.append({"from": "user" if i % 2 == 0 else "bot", "text": text})
+    return history
+
+
+def _docx_bytes(paragraphs: int) -> Optional[bytes]:
+    try:
+        from docx import Document
+    except ImportError:
+        return None
+    doc = Document()
+    for i in range(paragraphs):
+        doc.add_paragraph(f"Paragraph {i}: prompt injection mitigations and secret handling. " * 4)
+    buf = io.BytesIO()
+    doc.save(buf)
+    return buf.getvalue()
+
+
+# ------------------ Benchmarks ------------------
+def bench_history(repeat: int, rng: random.Random) -> Dict[str, Dict[str, float]]:
+    from app.pipelines import convert_history_for_bedrock
+
+    results = {}
+    for turns in (10, 100, 1000):
+        history = _history(turns, rng)
+        results[f"convert_history_for_bedrock[{turns}]"] = bench(
+            lambda: convert_history_for_bedrock(history), repeat
+        )
+    return results
+
+
+def _asgi_client():
+    """
+    httpx client bound to the app in-process, with the pipeline stubbed out,
+    so only request parsing / validation / response encoding is measured.
+    """
+    try:
+        import httpx
+    except ImportError:
+        return None
+    from app import main
+
+    async def _reply(*args, **kwargs) -> str:
+        return "ok"
+
+    main.handle_chat = _reply
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench")
+
+
+def _multipart(fields: Dict[str, str], boundary: str = "hyperchatbench") -> bytes:
+    # What the browser's FormData produces for text fields
+    parts = [
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+        for name, value in fields.items()
+    ]
+    return ("".join(parts) + f"--{boundary}--\r\n").encode("utf-8")
+
+
+def bench_wire(repeat: int, rng: random.Random) -> Dict[str, Dict[str, float]]:
+    import asyncio
+
+    from app.pipelines import convert_history_for_bedrock
+    from app.serialization import decode_chat_request, encode_response, loads_json
+
+    try:
+        import msgpack
+    except ImportError:
+        msgpack = None
+        print("msgpack not installed; skipping msgpack benchmarks")
+
+    loop = asyncio.new_event_loop()
+    client = _asgi_client()
+    if client is None:
+        print("httpx not installed; skipping in-process endpoint benchmarks")
+
+    results = {}
+    for turns in (10, 100, 1000):
+        history = _history(turns, rng)
+        request = {"backendId": "general-assistant-1", "message": "hello", "history": history}
+        history_field = json.dumps(history)
+        json_body = json.dumps(request).encode("utf-8")
+        msgpack_body = msgpack.packb(request) if msgpack is not None else None
+
+        # Decode + convert only. "json.loads" is the multipart path before
+        # the fast path existed; "multipart" is the same field via loads_json
+        results[f"decode[multipart json.loads {turns}]"] = bench(
+            lambda: convert_history_for_bedrock(json.loads(history_field)), repeat
+        )
+        results[f"decode[multipart {turns}]"] = bench(
+            lambda: convert_history_for_bedrock(loads_json(history_field)), repeat
+        )
+        results[f"decode[json {turns}]"] = bench(
+            lambda: convert_history_for_bedrock(
+                decode_chat_request(json_body, "application/json").history
+            ),
+            repeat,
+        )
+        if msgpack_body is not None:
+            results[f"decode[msgpack {turns}]"] = bench(
+                lambda: convert_history_for_bedrock(
+                    decode_chat_request(msgpack_body, "application/msgpack").history
+                ),
+                repeat,
+            )
+
+        # Full request through the ASGI app: form / body parsing, validation,
+        # history conversion, response encoding
+        if client is not None:
+            form_body = _multipart(
+                {"backendId": "general-assistant-1", "message": "hello", "history": history_field}
+            )
+            results[f"endpoint[multipart {turns}]"] = bench(
+                lambda: loop.run_until_complete(
+                    client.post(
+                        "/api/chat",
+                        content=form_body,
+                        headers={"Content-Type": "multipart/form-data; boundary=hyperchatbench"},
+                    )
+                ),
+                repeat,
+            )
+            results[f"endpoint[json {turns}]"] = bench(
+                lambda: loop.run_until_complete(
+                    client.post(
+                        "/api/chat/fast", content=json_body, headers={"Content-Type": "application/json"}
+                    )
+                ),
+                repeat,
+            )
+            if msgpack_body is not None:
+                results[f"endpoint[msgpack {turns}]"] = bench(
+                    lambda: loop.run_until_complete(
+                        client.post(
+                            "/api/chat/fast",
+                            content=msgpack_body,
+                            headers={"Content-Type": "application/msgpack"},
+                        )
+                    ),
+                    repeat,
+                )
+
+        sizes = f"history field={len(history_field):,}B json={len(json_body):,}B"
+        if msgpack_body is not None:
+            sizes += f" msgpack={len(msgpack_body):,}B"
+        print(f"request body @ {turns} turns: {sizes}")
+
+    if client is not None:
+        loop.run_until_complete(client.aclose())
+    loop.close()
+
+    reply = {"reply": " ".join(rng.choice(["alpha", "beta", "gamma", "delta"]) for _ in range(800))}
+    results["encode[json.dumps]"] = bench(lambda: json.dumps(reply).encode("utf-8"), repeat)
+    results["encode[response]"] = bench(lambda: encode_response(reply), repeat)
+    results["encode[response gzip]"] = bench(
+        lambda: encode_response(reply, accept_encoding="gzip"), repeat
+    )
+    return results
+
+
+def bench_extract(repeat: int, rng: random.Random) -> Dict[str, Dict[str, float]]:
+    from app.pipelines import extract_text_from_uploaded_file
+
+    results = {}
+    for size in (4 * 1024, 256 * 1024):
+        payload = ("lorem ipsum dolor sit amet " * (size // 27 + 1))[:size].encode("utf-8")
+        results[f"extract_text[txt {size // 1024}KB]"] = bench(
+            lambda: extract_text_from_uploaded_file(payload, "notes.txt", "text/plain"), repeat
+        )
+
+    for paragraphs in (50, 500):
+        docx = _docx_bytes(paragraphs)
+        if docx is None:
+            print("python-docx not installed; skipping DOCX extraction benchmarks")
+            break
+        results[f"extract_text[docx {paragraphs}p]"] = bench(
+            lambda: extract_text_from_uploaded_file(docx, "notes.docx", None), repeat
+        )
+    return results
+
+
+def bench_faiss(repeat: int, rng: random.Random, dim: int = 1536) -> Dict[str, Dict[str, float]]:
+    try:
+        import faiss
+        import numpy as np
+    except ImportError:
+        print("faiss / numpy not installed; skipping FAISS benchmarks")
+        return {}
+
+    np_rng = np.random.default_rng(rng.randint(0, 2**31))
+    results = {}
+    for n in (1_000, 20_000):
+        vectors = np_rng.standard_normal((n, dim), dtype=np.float32)
+        index = faiss.IndexFlatL2(dim)
+        index.add(vectors)
+        query = np_rng.standard_normal((1, dim), dtype=np.float32)
+        results[f"faiss_search[flat n={n} k=4]"] = bench(lambda: index.search(query, 4), repeat)
+    return results
+
+
+# ------------------ Regression Check ------------------
+def compare(current: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], tolerance: float) -> List[str]:
+    regressions = []
+    for name, stats in current.items():
+        base = baseline.get(name)
+        if not base or not base.get("p50_ms"):
+            continue
+        ratio = stats["p50_ms"] / base["p50_ms"]
+        if ratio > 1.0 + tolerance:
+            regressions.append(
+                f"{name}: p50 {stats['p50_ms']:.3f}ms vs baseline {base['p50_ms']:.3f}ms (x{ratio:.2f})"
+            )
+    return regressions
+
+
+# ------------------ CLI ------------------
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Microbenchmarks for backend helpers")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--only", choices=["history", "wire", "extract", "faiss"], action="append")
+    parser.add_argument("--json", dest="json_out", help="Write results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against a previous --json output")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args(argv)
+
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+
+    rng = random.Random(args.seed)
+    selected = args.only or ["history", "wire", "extract", "faiss"]
+    suites = {
+        "history": bench_history,
+        "wire": bench_wire,
+        "extract": bench_extract,
+        "faiss": bench_faiss,
+    }
+
+    results: Dict[str, Dict[str, float]] = {}
+    for name in selected:
+        results.update(suites[name](args.repeat, rng))
+
+    print("\n========== Microbenchmarks ==========")
+    for name, stats in results.items():
+        print(format_summary(name, stats))
+
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\nRegressions:")
+            for line in regressions:
+                print("  " + line)
+            return 1
+        print("\nNo regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
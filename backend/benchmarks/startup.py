@@ -0,0 +1,143 @@
+# benchmarks/startup.py
+"""
+Startup-time benchmark for the backend.
+
+Measures, over several cold runs:
+- import time of `app.main` in a fresh interpreter
+- which heavy modules that import pulled in (langchain, faiss, docx, boto3)
+- time until uvicorn serves its first response, and the latency of the first
+  general-chat request against the fake Bedrock server (with and without
+  HYPERCHAT_WARMUP)
+
+Run from the `backend` directory:
+    python -m benchmarks.startup --runs 5
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+from .stats import format_summary, summarize
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ["langchain_community", "langchain_openai", "faiss", "numpy", "docx", "boto3"]
+
+_IMPORT_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - started
+heavy = [m for m in %r if m in sys.modules]
+print(json.dumps({"elapsed": elapsed, "heavy": heavy}))
+""" % (HEAVY_MODULES,)
+
+
+def _env(fake_port: int, warmup: bool) -> Dict[str, str]:
+    fake_url = f"http://127.0.0.1:{fake_port}"
+    env = dict(os.environ)
+    env.update(
+        {
+            "BEDROCK_ENDPOINT_URL": fake_url,
+            "OPENAI_BASE_URL": f"{fake_url}/v1",
+            "OPENAI_API_BASE": f"{fake_url}/v1",
+            "AWS_ACCESS_KEY_ID": "fake",
+            "AWS_SECRET_ACCESS_KEY": "fake",
+            "HYPERCHAT_WARMUP": "1" if warmup else "0",
+        }
+    )
+    return env
+
+
+def measure_import(runs: int, env: Dict[str, str]) -> Dict[str, object]:
+    samples: List[float] = []
+    heavy: List[str] = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", _IMPORT_PROBE],
+            cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+        )
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        samples.append(result["elapsed"])
+        heavy = result["heavy"]
+    return {"import": summarize(samples), "heavy_modules_loaded": heavy}
+
+
+def measure_first_request(runs: int, port: int, env: Dict[str, str]) -> Dict[str, object]:
+    ready_samples: List[float] = []
+    first_samples: List[float] = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=BACKEND_DIR, env=env,
+        )
+        try:
+            url = f"http://127.0.0.1:{port}"
+            while True:
+                try:
+                    httpx.get(f"{url}/openapi.json", timeout=1.0)
+                    break
+                except httpx.HTTPError:
+                    if proc.poll() is not None:
+                        raise RuntimeError("uvicorn exited during startup")
+                    time.sleep(0.02)
+            ready_samples.append(time.perf_counter() - started)
+
+            request_started = time.perf_counter()
+            httpx.post(
+                f"{url}/api/chat",
+                data={"backendId": "general-assistant-1", "message": "hello", "history": "[]"},
+                timeout=60.0,
+            )
+            first_samples.append(time.perf_counter() - request_started)
+        finally:
+            proc.terminate()
+            proc.wait(timeout=10)
+    return {"ready": summarize(ready_samples), "first_request": summarize(first_samples)}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Backend startup benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--app-port", type=int, default=4101)
+    parser.add_argument("--fake-port", type=int, default=8701)
+    parser.add_argument("--json", dest="json_out")
+    args = parser.parse_args(argv)
+
+    fake = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fake_services", "--port", str(args.fake_port),
+         "--bedrock-latency", "constant:50"],
+        cwd=BACKEND_DIR,
+    )
+    try:
+        time.sleep(1.0)
+        results: Dict[str, object] = {}
+        results.update(measure_import(args.runs, _env(args.fake_port, warmup=False)))
+        results["cold"] = measure_first_request(args.runs, args.app_port, _env(args.fake_port, warmup=False))
+        results["warmup"] = measure_first_request(args.runs, args.app_port, _env(args.fake_port, warmup=True))
+    finally:
+        fake.terminate()
+        fake.wait(timeout=10)
+
+    print("\n========== Startup ==========")
+    print(format_summary("import app.main", results["import"]))
+    print(f"heavy modules loaded at import: {results['heavy_modules_loaded'] or 'none'}")
+    for mode in ("cold", "warmup"):
+        print(format_summary(f"[{mode}] time to ready", results[mode]["ready"]))
+        print(format_summary(f"[{mode}] first general request", results[mode]["first_request"]))
+
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
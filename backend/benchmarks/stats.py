@@ -0,0 +1,163 @@
+# benchmarks/stats.py
+
+import os
+import random
+from typing import Dict, List, Optional
+
+
+# ------------------ Latency Distributions ------------------
+class LatencyDistribution:
+    """
+    Samples simulated latencies (in seconds) from a spec string:
+
+        "constant:200"          -> always 200 ms
+        "uniform:100,400"       -> uniformly between 100 and 400 ms
+        "normal:250,50"         -> mean 250 ms, stddev 50 ms (clamped at 0)
+        "lognormal:250,0.5"     -> median 250 ms, sigma 0.5 (long right tail)
+
+    A bare number ("150") is treated as constant milliseconds.
+    """
+
+    def __init__(self, spec: str, seed: Optional[int] = None) -> None:
+        self.spec = spec
+        self._rng = random.Random(seed)
+
+        kind, _, args = spec.partition(":")
+        if not args:
+            kind, args = "constant", kind
+
+        try:
+            self._params = [float(a) for a in args.split(",") if a.strip()]
+        except ValueError:
+            raise ValueError(f"Invalid latency spec: {spec!r}")
+
+        self._kind = kind.strip().lower()
+        expected = {"constant": 1, "uniform": 2, "normal": 2, "lognormal": 2}
+        if self._kind not in expected or len(self._params) != expected[self._kind]:
+            raise ValueError(f"Invalid latency spec: {spec!r}")
+
+    def sample(self) -> float:
+        """
+        Return one latency sample in seconds.
+        """
+        p = self._params
+        if self._kind == "constant":
+            ms = p[0]
+        elif self._kind == "uniform":
+            ms = self._rng.uniform(p[0], p[1])
+        elif self._kind == "normal":
+            ms = self._rng.gauss(p[0], p[1])
+        else:
+            # lognormvariate takes mu of the underlying normal; median = exp(mu)
+            ms = p[0] * self._rng.lognormvariate(0.0, p[1])
+        return max(ms, 0.0) / 1000.0
+
+
+# ------------------ Percentiles / Summaries ------------------
+def percentile(samples: List[float], pct: float) -> float:
+    """
+    Nearest-rank-with-interpolation percentile of an unsorted sample list.
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    pos = (len(ordered) - 1) * (pct / 100.0)
+    lower = int(pos)
+    upper = min(lower + 1, len(ordered) - 1)
+    frac = pos - lower
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * frac
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """
+    p50/p95/p99/mean/max of a list of durations (seconds), reported in ms.
+    """
+    if not samples:
+        return {"count": 0, "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "mean_ms": 0.0, "max_ms": 0.0}
+    return {
+        "count": len(samples),
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p95_ms": percentile(samples, 95) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "mean_ms": sum(samples) / len(samples) * 1000,
+        "max_ms": max(samples) * 1000,
+    }
+
+
+def format_summary(name: str, summary: Dict[str, float]) -> str:
+    return (
+        f"{name:<40} n={int(summary['count']):>6}  "
+        f"p50={summary['p50_ms']:>9.3f}ms  "
+        f"p95={summary['p95_ms']:>9.3f}ms  "
+        f"p99={summary['p99_ms']:>9.3f}ms  "
+        f"max={summary['max_ms']:>9.3f}ms"
+    )
+
+
+# ------------------ Process Memory ------------------
+def rss_bytes(pid: int) -> Optional[int]:
+    """
+    Resident set size of a process, using psutil when installed and falling
+    back to /proc on Linux. Returns None when it cannot be determined.
+    """
+    try:
+        import psutil  # optional
+
+        return psutil.Process(pid).memory_info().rss
+    except ImportError:
+        pass
+    except Exception:
+        return None
+
+    status_path = f"/proc/{pid}/status"
+    if not os.path.exists(status_path):
+        return None
+    try:
+        with open(status_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+def child_pids(pid: int) -> List[int]:
+    """
+    Direct children of a process (uvicorn workers under a --workers master).
+    """
+    try:
+        import psutil  # optional
+
+        return [c.pid for c in psutil.Process(pid).children(recursive=False)]
+    except ImportError:
+        pass
+    except Exception:
+        return []
+
+    children_path = f"/proc/{pid}/task/{pid}/children"
+    try:
+        with open(children_path, "r", encoding="utf-8") as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+
+def process_cmdline(pid: int) -> List[str]:
+    """
+    Command line of a process, or [] when it cannot be read.
+    """
+    try:
+        import psutil  # optional
+
+        return psutil.Process(pid).cmdline()
+    except ImportError:
+        pass
+    except Exception:
+        return []
+
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            return [a.decode("utf-8", "replace") for a in f.read().split(b"\0") if a]
+    except OSError:
+        return []
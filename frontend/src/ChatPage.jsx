@@ -198,21 +198,35 @@ export default function ChatPage() {
     setIsSending(true);
 
     try {
-      // 2) Build FormData instead of JSON
-      const formData = new FormData();
-      formData.append("modelId", modelId);
-      formData.append("backendId", currentModel.backendId);
-      formData.append("message", text);
-      formData.append("history", JSON.stringify(historyForRequest));
+      // 2) Only the fields the backend reads (drops timestamps / file info)
+      const history = historyForRequest.map(({ from, text }) => ({ from, text }));
 
+      let res;
       if (currentFile) {
+        // Uploads go as FormData
+        const formData = new FormData();
+        formData.append("modelId", modelId);
+        formData.append("backendId", currentModel.backendId);
+        formData.append("message", text);
+        formData.append("history", JSON.stringify(history));
         formData.append("file", currentFile);
-      }
 
-      const res = await fetch("http://localhost:4000/api/chat", {
-        method: "POST",
-        body: formData, // browser sets correct multipart boundary
-      });
+        res = await fetch("http://localhost:4000/api/chat", {
+          method: "POST",
+          body: formData, // browser sets correct multipart boundary
+        });
+      } else {
+        // Text-only chats: one JSON body, validated once on the backend
+        res = await fetch("http://localhost:4000/api/chat/fast", {
+          method: "POST",
+          headers: { "Content-Type": "application/json" },
+          body: JSON.stringify({
+            backendId: currentModel.backendId,
+            message: text,
+            history,
+          }),
+        });
+      }
 
       const data = await res.json();
       const botText =
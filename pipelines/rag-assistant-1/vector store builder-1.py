@@ -1,32 +1,39 @@
 # ------------------------------------ Imports ----------------------------------
+from datetime import date
 from dotenv import load_dotenv
 from langchain_classic.chains.combine_documents import create_stuff_documents_chain
 from langchain_classic.chains.retrieval import create_retrieval_chain
-from langchain_community.document_loaders.text import TextLoader
 from langchain_community.vectorstores import FAISS
-from langchain_community.document_loaders import (
-    TextLoader,
-    PyPDFLoader,
-    Docx2txtLoader,
-    UnstructuredFileLoader,
-    UnstructuredHTMLLoader,
-    UnstructuredPDFLoader
-)
-
+from langchain_core.documents import Document
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 import numpy as np
 import matplotlib.pyplot as plt
 import os
 from pathlib import Path
 from sklearn.decomposition import PCA
+import sys
 import xml.etree.ElementTree as ET
 
 
 # ------------------------------------ Constants / Variables ----------------------------------
 script_dir = os.path.dirname(os.path.abspath(__file__))
 
+# Shared extraction + chunking lives in the backend (backend/app/documents.py),
+# so the knowledge base is parsed exactly like uploads are
+backend_dir = os.path.abspath(os.path.join(script_dir, "..", "..", "backend"))
+sys.path.insert(0, backend_dir)
+from app.dedup import Deduplicator  # noqa: E402
+from app.documents import iter_file_chunks  # noqa: E402
+
+# Chunk sizes in tokens (~800 / ~100 characters)
+CHUNK_TOKENS = 200
+CHUNK_OVERLAP_TOKENS = 25
+
+# Also write one store per tenant (first folder under "knowledge base") to
+# vectorstore_db_shards/<tenant>, for configs using "vector_stores"
+SHARD_BY_TENANT = False
+
 # AI Model
 MODEL = "gpt-4o-mini"
 
@@ -59,87 +66,77 @@ def print_banner(text: str) -> None:
     print("*" + "-*" * 50)
 
 
-def get_loader_for_path(path: Path):
-    """
-    Return an appropriate LangChain loader based on file extension.
-    """
-    suffix = path.suffix.lower()
-
-    if suffix in {".txt", ".md"}:
-        return TextLoader(str(path), encoding="utf-8")
-
-    if suffix == ".pdf":
-        try:
-            return PyPDFLoader(str(path))  # fast, but limited
-        except:
-            return UnstructuredPDFLoader(str(path))  # fallback, more powerful
-
-    if suffix == ".docx":
-        return Docx2txtLoader(str(path))
-
-    if suffix in {".html", ".htm"}:
-        return UnstructuredHTMLLoader(str(path))
-
-    # Fallback: try UnstructuredFileLoader for anything else
-    return UnstructuredFileLoader(str(path))
-
-
-# ------------------------------------ Read in Documents using LangChain's Loader ----------------------------------
-print_banner("Read in Documents using LangChain's Loader")
+# ------------------------------------ Read in + Chunk Documents (streaming) ----------------------------------
+print_banner("Read in + Chunk Documents")
 
 print("\nLoading documents back in with metadata")
-all_docs = []
+chunks = []
 
 knowledge_base_dir = Path(script_dir) / "knowledge base"
 
-# Walk the knowledge base directory and load all supported files
+# Walk the knowledge base directory and chunk all supported files.
+# Chunks follow headings / sections and are sized in tokens.
 for path in knowledge_base_dir.rglob("*"):
     if not path.is_file():
         continue
 
-    try:
-        loader = get_loader_for_path(path)
-    except Exception as e:
-        print(f"⚠️ Skipping {path} (no loader): {e}")
-        continue
+    # Metadata the backend can filter on (see backend/app/shards.py)
+    relative = path.relative_to(knowledge_base_dir)
+    file_metadata = {
+        "tenant": relative.parts[0] if len(relative.parts) > 1 else "shared",
+        "doc_type": path.suffix.lower().lstrip("."),
+        "date": date.fromtimestamp(path.stat().st_mtime).isoformat(),
+    }
 
     try:
-        loaded_docs = loader.load()
+        file_chunks = [
+            Document(page_content=c.text, metadata={**c.metadata, **file_metadata})
+            for c in iter_file_chunks(
+                str(path),
+                chunk_tokens=CHUNK_TOKENS,
+                overlap_tokens=CHUNK_OVERLAP_TOKENS,
+            )
+        ]
     except Exception as e:
         print(f"⚠️ Error loading {path}: {e}")
         continue
 
-    for d in loaded_docs:
-        # Common metadata
-        d.metadata["source_path"] = str(path)
-        d.metadata["source_name"] = path.name
-
-
-        all_docs.append(d)
-        print(f"✅ Loaded: {path}")
+    chunks.extend(file_chunks)
+    print(f"✅ Loaded: {path} ({len(file_chunks)} chunks)")
 
-# # Preview the first document
-# if all_docs:
-#     print("\nExample document at index 0:")
-#     print(all_docs[0])
-# else:
-#     print("\nNo documents found in knowledge base.")
 
+# ------------------------------------ Inspect the Chunks Created ----------------------------------
+print_banner("Inspect the Chunks Created")
 
-# ------------------------------------ Break Down Documents into Overlapping Chunks ----------------------------------
-print_banner("Break Down Documents into Overlapping Chunks")
-
-text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=800,
-    chunk_overlap=100,
-)
-chunks = text_splitter.split_documents(all_docs)
-
+print(f"*{len(chunks)} number of chunks were created")
 
-# ------------------------------------ Inspect the Chunks Created by LangChain ----------------------------------
-print_banner("Inspect the Chunks Created by LangChain")
 
-print(f"*{len(chunks)} number of chunks were created")
+# ------------------------------------ Drop Duplicate Chunks ----------------------------------
+print_banner("Drop Duplicate Chunks")
+
+# Exact hashing + MinHash/LSH near-duplicate detection before embedding.
+# Repeated boilerplate keeps one copy, whose metadata["sources"] lists every
+# document / page / tenant it appeared in.
+if SHARD_BY_TENANT:
+    # Dedup within each tenant first, so every tenant shard keeps its own
+    # copy of boilerplate shared with other tenants
+    tenant_deduplicators = {}
+    for chunk in chunks:
+        tenant_deduplicators.setdefault(chunk.metadata["tenant"], Deduplicator()).add(chunk)
+    chunks = [c for t in sorted(tenant_deduplicators) for c in tenant_deduplicators[t].survivors]
+    removed = sum(d.exact_duplicates + d.near_duplicates for d in tenant_deduplicators.values())
+    print(f"*Removed {removed} duplicate chunks within tenants")
+
+# Then across tenants for the combined store. Survivors are copied when
+# sharding so the tenant shards' chunks don't pick up other tenants' sources
+deduplicator = Deduplicator(copy_survivors=SHARD_BY_TENANT)
+store_members = [i for i, chunk in enumerate(chunks) if deduplicator.add(chunk) is not None]
+store_chunks = deduplicator.survivors
+if not SHARD_BY_TENANT:
+    chunks = store_chunks
+
+print(f"*Removed {deduplicator.exact_duplicates} exact and {deduplicator.near_duplicates} near-duplicate chunks")
+print(f"*{len(chunks)} unique chunks will be embedded")
 
 # # Inspect chunks:
 # for chunk in chunks:
@@ -157,9 +154,18 @@ embeddings = OpenAIEmbeddings(api_key=openai_api_key)
 # Define the path where the vector database will be stored
 faiss_vector_store = script_dir + "\\vectorstore_db"
 
+# Embed every chunk once; the full store, the tenant shards and the
+# visualization below all reuse these vectors
+texts = [c.page_content for c in chunks]
+vectors = embeddings.embed_documents(texts)
+
 # Create a FAISS (Facebook AI Similarity Search) vector store from the pre-chunked documents.
-# This will generate vector embeddings and store them in memory.  
-vectorstore = FAISS.from_documents(chunks, embedding=embeddings)
+store_vectors = [vectors[i] for i in store_members]
+vectorstore = FAISS.from_embeddings(
+    [(c.page_content, v) for c, v in zip(store_chunks, store_vectors)],
+    embedding=embeddings,
+    metadatas=[c.metadata for c in store_chunks],
+)
 
 # Analyze the vectorstore
 total_vectors = vectorstore.index.ntotal
@@ -171,6 +177,18 @@ print(f"*There are {total_vectors} vectors with {dimensions:,} dimensions in the
 vectorstore.save_local(faiss_vector_store)
 print(f"✅ Saved FAISS index to: {faiss_vector_store}")
 
+if SHARD_BY_TENANT:
+    for tenant in sorted({c.metadata["tenant"] for c in chunks}):
+        members = [i for i, c in enumerate(chunks) if c.metadata["tenant"] == tenant]
+        shard = FAISS.from_embeddings(
+            [(texts[i], vectors[i]) for i in members],
+            embedding=embeddings,
+            metadatas=[chunks[i].metadata for i in members],
+        )
+        shard_path = os.path.join(script_dir, "vectorstore_db_shards", tenant)
+        shard.save_local(shard_path)
+        print(f"✅ Saved {len(members)} vectors for tenant '{tenant}' to: {shard_path}")
+
 # To load vector db in
 # print("Load Vector Store Back In")
 # vectorstore = FAISS.load_local(
@@ -183,10 +201,8 @@ print(f"✅ Saved FAISS index to: {faiss_vector_store}")
 # ------------------------------------ 3D Embedding Visualization ----------------------------------
 print_banner("3D Visualization of Embeddings")
 
-# 1. Compute embeddings for each text chunk
-texts = [c.page_content for c in chunks]
-X = embeddings.embed_documents(texts)
-X = np.array(X)  # shape: (num_chunks, 1536)
+# 1. Embeddings for each text chunk in the store (computed above)
+X = np.array(store_vectors)  # shape: (num_chunks, 1536)
 
 print(f"Embedding matrix: {X.shape}")
 
@@ -201,7 +217,7 @@ ax = fig.add_subplot(111, projection="3d")
 ax.scatter(X_3d[:, 0], X_3d[:, 1], X_3d[:, 2], s=40)
 
 # Label some points with PMID or short identifiers
-for i, doc in enumerate(chunks):
+for i, doc in enumerate(store_chunks):
     pmid = doc.metadata.get("pmid", "")
     if i % 5 == 0:  # label every 5th to avoid clutter
         ax.text(X_3d[i, 0], X_3d[i, 1], X_3d[i, 2], pmid)